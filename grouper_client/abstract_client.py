@@ -1,54 +1,303 @@
-from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
+import threading
+import gzip
+import functools
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+from grouper_client.json_codec import json_dumps, json_loads
+
+try:
+    import httpx
+except ImportError:  # httpx is only needed for the optional HTTP/2 backend
+    httpx = None
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; large responses are read in full before parsing without it
+    ijson = None
 
 
 logger = logging.getLogger('grouper_client')
 
 VERIFY_CERTS = os.getenv('VERIFY_CERTS', 'True').lower() in ['true', '1', 'yes']
+# gzip request bodies larger than GZIP_MIN_BYTES. Off by default because the
+# server has to be configured to accept compressed request bodies.
+COMPRESS_REQUESTS = os.getenv('GROUPER_COMPRESS_REQUESTS', 'False').lower() in ['true', '1', 'yes']
+GZIP_MIN_BYTES = 4096
+# size of the thread pool used for concurrent requests. Connection pools are sized
+# to at least this many connections so that workers do not wait on each other.
+MAX_WORKERS = int(os.getenv('GROUPER_POOL', '8'))
+
+# transient gateway errors are retried at the connection layer with exponential
+# backoff; authentication failures are handled separately by renewing the token.
+# Grouper WS operations are idempotent, so POST requests are retried as well.
+TRANSIENT_RETRY = Retry(total=2,
+                        status_forcelist=[502, 503, 504],
+                        allowed_methods=None,
+                        backoff_factor=0.5,
+                        respect_retry_after_header=True,
+                        raise_on_status=False)
+# the longest the HTTP/2 backend waits before a retry, however long Retry-After asks for
+RETRY_DELAY_MAX = 30
+
+if httpx is not None:
+    class _RetryTransport(httpx.HTTPTransport):
+        """
+        httpx transport that retries transient gateway errors the way TRANSIENT_RETRY does for
+        the requests backend: up to TRANSIENT_RETRY.total times, after the Retry-After delay
+        or with exponential backoff, waiting at most RETRY_DELAY_MAX seconds. Connection failures
+        are retried by the transport itself.
+        """
+
+        def handle_request(self, request):
+            for attempt in range(TRANSIENT_RETRY.total + 1):
+                response = super().handle_request(request)
+                if attempt == TRANSIENT_RETRY.total or response.status_code not in TRANSIENT_RETRY.status_forcelist:
+                    return response
+                retry_after = response.headers.get('Retry-After', '')
+                response.close()
+                if retry_after.isdigit():
+                    delay = int(retry_after)
+                else:
+                    delay = TRANSIENT_RETRY.backoff_factor * 2 ** attempt
+                delay = min(delay, RETRY_DELAY_MAX)
+                logger.debug("%s %s returned %s, retrying in %.1fs",
+                             request.method, request.url, response.status_code, delay)
+                time.sleep(delay)
+
+
+def _items_at(document, prefix):
+    """
+    Returns the values found at an ijson-style prefix, such as 'results.item.wsSubjects.item',
+    of an already parsed JSON document. Like ijson, keys missing within the arrays of the
+    prefix yield no values, but the keys before its first array must be present.
+    :raises ValueError: If a key before the first array of the prefix is missing.
+    """
+    values = [document]
+    keys = prefix.split('.')
+    for i, key in enumerate(keys):
+        if key == 'item':
+            values = [v for value in values for v in value]
+        elif 'item' not in keys[:i]:
+            if not isinstance(values[0], dict) or key not in values[0]:
+                raise ValueError(f"Unexpected response from Grouper, {prefix} not found: {document}")
+            values = [values[0][key]]
+        else:
+            values = [value[key] for value in values if key in value]
+    return values
+
+
+class _RecordedBody:
+    """
+    File-like wrapper of a streamed response body that keeps a copy of the bytes read
+    until stop_recording is called, so that the body can be parsed again in full.
+    """
+    __slots__ = ('_raw', '_chunks')
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._chunks = []
+
+    def read(self, size=-1):
+        data = self._raw.read(size)
+        if self._chunks is not None:
+            self._chunks.append(data)
+        return data
+
+    def stop_recording(self):
+        self._chunks = None
+
+    @property
+    def recording(self):
+        return self._chunks is not None
+
+    def getvalue(self):
+        return b''.join(self._chunks)
+
+
+# errors raised by raise_for_status() for either HTTP backend
+HTTP_ERRORS = (requests.exceptions.HTTPError,) + ((httpx.HTTPStatusError,) if httpx is not None else ())
+# any error raised while sending a request or by raise_for_status(), for either HTTP backend
+REQUEST_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx is not None else ())
+# errors raised when the server could not be reached or did not answer in time, for either HTTP backend
+CONNECTION_ERRORS = ((requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+                     + ((httpx.TransportError,) if httpx is not None else ()))
+
+
+def is_unavailable(error):
+    """
+    Returns True if a request failed because the server is unavailable: it could not be
+    reached, timed out, or answered with a 5xx status. Client errors such as 400 or 403 are not.
+    :param error: An exception from REQUEST_ERRORS.
+    :return: True if the error is a connection error, a timeout, or a server error.
+    """
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    response = getattr(error, 'response', None)
+    return isinstance(error, HTTP_ERRORS) and response is not None and response.status_code >= 500
+
 
 class AbstractClient:
-    url = None
-    refresh_token = None
-    token = None
+    # clients have a fixed set of attributes, so instances do not need a __dict__.
+    # Subclasses should declare their own attributes in __slots__ as well.
+    __slots__ = ('url', 'refresh_token', 'max_workers', '_token', '_auth_header',
+                 '_body_kwarg', '_request_kwargs', '_session', '_executor', '_executor_lock', '_abs')
+
+    def __init__(self, http2=False):
+        """
+        :param http2: If True, uses an httpx client that multiplexes concurrent requests
+            over a single HTTP/2 connection instead of a pooled requests session.
+            Requires the optional httpx dependency.
+        """
+        self.url = None
+        self.refresh_token = None
+        self.max_workers = MAX_WORKERS
+        self._token = None
+        self._auth_header = None
+        if http2:
+            if httpx is None:
+                raise ImportError("The HTTP/2 backend requires httpx. "
+                                  "Install it with: pip install grouper-client[http2]")
+            # httpx takes a raw request body as content rather than data
+            self._body_kwarg = 'content'
+            self._request_kwargs = {}
+            transport = _RetryTransport(http2=True,
+                                        verify=VERIFY_CERTS,
+                                        retries=TRANSIENT_RETRY.total,
+                                        limits=httpx.Limits(
+                                            max_keepalive_connections=max(16, MAX_WORKERS),
+                                            max_connections=max(64, MAX_WORKERS)))
+            self._session = httpx.Client(transport=transport,
+                                         timeout=30,
+                                         headers={'Accept': 'application/json',
+                                                  'Content-Type': 'application/json'})
+        else:
+            # a single pooled session lets consecutive calls reuse the same
+            # keep-alive connection instead of paying a TCP/TLS handshake each time
+            self._body_kwarg = 'data'
+            # verify is passed with every request: requests replaces a value set only on the
+            # session with REQUESTS_CA_BUNDLE or CURL_CA_BUNDLE whenever either is set
+            self._request_kwargs = {'verify': VERIFY_CERTS}
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=10,
+                                  pool_maxsize=max(32, MAX_WORKERS),
+                                  max_retries=TRANSIENT_RETRY)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+            self._session.headers.update({'Accept': 'application/json',
+                                          'Content-Type': 'application/json'})
+        # the shared thread pool is only started when it is first needed
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # absolute endpoint URLs are built once per endpoint rather than parsed on every call
+        self._abs = functools.lru_cache(maxsize=32)(self._join_url)
+
+    def close(self):
+        """Closes the underlying HTTP session and its pooled connections."""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def token(self):
+        return self._token
+
+    @token.setter
+    def token(self, value):
+        # the Authorization header is formatted once per token rather than once per request
+        self._token = value
+        self._auth_header = f'Bearer {value}' if value is not None else None
 
     def renew_token(self, refresh_token):
         raise NotImplementedError
 
+    def invalidate_token(self):
+        """Discards the current token so that the next request obtains a new one."""
+        self.token = None
+
+    def _ensure_token(self):
+        """Obtains a token before a request is sent, if there is none yet."""
+        if self.token is None and self.refresh_token is not None:
+            self.renew_token(self.refresh_token)
+
+    def _fan_out(self, fn, items, max_workers=None):
+        """
+        Calls fn once per item, overlapping the calls on a thread pool that shares
+        this client's session. Results are returned in the order of items.
+        If max_workers is given, a dedicated pool of that size is used for this call
+        instead of the client's shared pool.
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(i) for i in items]
+        if max_workers is not None:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='grouper_client') as pool:
+                return list(pool.map(fn, items))
+        return list(self._get_executor().map(fn, items))
+
+    def _submit(self, fn, *args, **kwargs):
+        """
+        Schedules fn to run on the client's shared thread pool and returns its Future.
+        """
+        return self._get_executor().submit(fn, *args, **kwargs)
+
+    def _get_executor(self):
+        executor = self._executor
+        if executor is None:
+            # threads that first need the pool at the same time must not each start one
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='grouper_client')
+                executor = self._executor
+        return executor
+
+    def _join_url(self, endpoint):
+        return self.url + endpoint.lstrip('/')
+
     def _get_headers(self, additional_headers=None, skip_auth=False):
-        headers = {
-            'Accept': 'application/json'
-        }
-        if not skip_auth:
-            headers['Authorization'] = f'Bearer {self.token}'
+        headers = {} if skip_auth else {'Authorization': self._auth_header}
         if additional_headers is not None:
             headers.update(additional_headers)
         return headers
 
     def _send_get_request(self, endpoint, params=None, retries=2):
-        if self.token is None and self.refresh_token is not None:
-            self.renew_token(self.refresh_token)
+        self._ensure_token()
 
-        logger.debug("%s %s payload: %s", "GET", urljoin(self.url, endpoint), params)
+        url = self._abs(endpoint)
+        logger.debug("%s %s payload: %s", "GET", url, params)
         headers = self._get_headers()
         logger.debug("Headers: %s", headers)
-        r = requests.get(urljoin(self.url, endpoint),
-                         params=params if params is not None else {},
-                         headers=headers,
-                         verify=VERIFY_CERTS,
-                         timeout=30)
+        r = self._session.get(url,
+                              params=params if params is not None else {},
+                              headers=headers,
+                              timeout=30,
+                              **self._request_kwargs)
         try:
             logger.debug("Response status: %s", r.status_code)
-            logger.debug("Response body: %s", r.text)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response body: %s", r.text)
             r.raise_for_status()
-        except requests.exceptions.HTTPError as e:
+        except HTTP_ERRORS as e:
             if self.refresh_token is not None and retries > 0 and e.response.status_code in [401, 403]:
+                self.invalidate_token()
                 self.renew_token(self.refresh_token)
-                self._send_get_request(endpoint, params, retries=(retries - 1))
+                return self._send_get_request(endpoint, params, retries=(retries - 1))
             else:
                 raise e
-        return r.json()
+        return json_loads(r.content)
 
     def _send_post_request(self, endpoint, payload, headers=None, skip_auth=False):
         return self._send_body('POST', endpoint, payload, headers, skip_auth)
@@ -60,61 +309,119 @@ class AbstractClient:
         return self._send_body('PATCH', endpoint, payload, headers, skip_auth)
     
     def _send_body(self, http_method, endpoint, payload, headers=None, skip_auth=False, retries=2):
-        if not skip_auth and self.token is None and self.refresh_token is not None:
-            self.renew_token(self.refresh_token)
+        if not skip_auth:
+            self._ensure_token()
 
         # list of valid http methods
         if http_method not in ['POST', 'PUT', 'PATCH', 'DELETE']:
             raise ValueError(f'Invalid http method: {http_method}')
         
-        headers = headers if headers is not None else {}
-        headers.update({'Content-Type': 'application/json'})
-
-        logger.debug("%s %s payload: %s", http_method, urljoin(self.url, endpoint), payload)
-        headers = self._get_headers(headers, skip_auth=skip_auth)
-        logger.debug("Headers: %s", headers)
-        r = requests.request(http_method, urljoin(self.url, endpoint),
-                          json=payload,
-                          headers=headers,
-                          verify=VERIFY_CERTS,
-                          timeout=20)
+        url = self._abs(endpoint)
+        logger.debug("%s %s payload: %s", http_method, url, payload)
+        request_headers = self._get_headers(headers, skip_auth=skip_auth)
+        body = self._encode_body(payload, request_headers)
+        logger.debug("Headers: %s", request_headers)
+        r = self._session.request(http_method, url,
+                                  headers=request_headers,
+                                  timeout=20,
+                                  **self._request_kwargs,
+                                  **{self._body_kwarg: body})
         
         try:
             logger.debug("Response status: %s", r.status_code)
-            logger.debug("Response body: %s", r.text)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response body: %s", r.text)
             r.raise_for_status()
-        except requests.exceptions.HTTPError as e:
+        except HTTP_ERRORS as e:
             if self.refresh_token is not None and retries > 0 and e.response.status_code in [401, 403]:
+                self.invalidate_token()
                 self.renew_token(self.refresh_token)
-                self._send_body(http_method, endpoint, payload, headers, skip_auth, retries=(retries - 1))
+                return self._send_body(http_method, endpoint, payload, headers, skip_auth, retries=(retries - 1))
             else:
                 raise e
-        #print(r.headers)
-        return r.json()
+        return json_loads(r.content)
+
+    def _stream_post_items(self, endpoint, payload, prefix, retries=2):
+        """
+        Sends a POST request and yields the values at prefix in the response, an ijson
+        prefix such as 'WsGetMembersResults.results.item.wsSubjects.item', as the body
+        is received. Large responses are then never held in memory in full.
+        Without ijson, or with the HTTP/2 backend, the response is read and parsed in full.
+        :raises ValueError: If the response does not contain the keys before the first
+            array of the prefix, e.g. because Grouper returned a problem rather than results.
+        """
+        if ijson is None or not isinstance(self._session, requests.Session):
+            yield from _items_at(self._send_post_request(endpoint, payload), prefix)
+            return
+        self._ensure_token()
+
+        url = self._abs(endpoint)
+        logger.debug("%s %s payload: %s", "POST", url, payload)
+        request_headers = self._get_headers()
+        body = self._encode_body(payload, request_headers)
+        logger.debug("Headers: %s", request_headers)
+        with self._session.post(url, headers=request_headers, timeout=20, data=body, stream=True,
+                                **self._request_kwargs) as r:
+            try:
+                logger.debug("Response status: %s", r.status_code)
+                r.raise_for_status()
+            except HTTP_ERRORS as e:
+                if not (self.refresh_token is not None and retries > 0 and e.response.status_code in [401, 403]):
+                    raise e
+            else:
+                r.raw.decode_content = True
+                body = _RecordedBody(r.raw)
+                for item in ijson.items(body, prefix, use_float=True):
+                    # a response with values at prefix has the expected shape
+                    body.stop_recording()
+                    yield item
+                if body.recording:
+                    # nothing was found, either because there is nothing at prefix, e.g. an
+                    # empty group, or because the response has a different shape
+                    _items_at(json_loads(body.getvalue()), prefix)
+                return
+        self.invalidate_token()
+        self.renew_token(self.refresh_token)
+        yield from self._stream_post_items(endpoint, payload, prefix, retries=(retries - 1))
+
+    def _encode_body(self, payload, request_headers):
+        """
+        Serializes a request payload, compressing it if it is large and COMPRESS_REQUESTS is set.
+        :param payload: The request payload, or a payload that is already serialized to JSON bytes.
+        :param request_headers: The request headers. Content-Encoding is added if the body is compressed.
+        :return: The request body.
+        """
+        body = payload if isinstance(payload, bytes) else json_dumps(payload)
+        if COMPRESS_REQUESTS and len(body) > GZIP_MIN_BYTES:
+            body = gzip.compress(body)
+            request_headers['Content-Encoding'] = 'gzip'
+        return body
 
     def _send_delete_request(self, endpoint, body=None, retries=2):
         if body is not None:
             return self._send_body('DELETE', endpoint, body)
-        if self.token is None and self.refresh_token is not None:
-            self.renew_token(self.refresh_token)
+        self._ensure_token()
 
-        logger.debug("%s %s payload: %s", "DELETE", urljoin(self.url, endpoint), body)
+        url = self._abs(endpoint)
+        logger.debug("%s %s payload: %s", "DELETE", url, body)
         headers = self._get_headers()
         logger.debug("Headers: %s", headers)
-        r = requests.delete(urljoin(self.url, endpoint),
-                            headers=headers,
-                            verify=VERIFY_CERTS,
-                            timeout=10)
+        r = self._session.delete(url,
+                                 headers=headers,
+                                 timeout=10,
+                                 **self._request_kwargs)
 
         try:
             logger.debug("Response status: %s", r.status_code)
-            logger.debug("Response body: %s", r.text)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response body: %s", r.text)
             r.raise_for_status()
             return {'status': r.status_code}
-        except requests.exceptions.HTTPError as e:
+        except HTTP_ERRORS as e:
             if self.refresh_token is not None and retries > 0 and e.response.status_code in [401, 403]:
+                self.invalidate_token()
                 self.renew_token(self.refresh_token)
-                self._send_delete_request(endpoint, body, retries=(retries - 1))
+                return self._send_delete_request(endpoint, body, retries=(retries - 1))
             else:
                 raise e
         
\ No newline at end of file
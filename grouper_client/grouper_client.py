@@ -8,50 +8,262 @@ a Grouper environment.
 Classes:
     - GrouperClient: A client for performing operations such as retrieving groups, 
       managing group memberships, and checking user or group existence.
+    - GroupMembers: The members of a group, keyed by member id, with a set of their usernames.
+    - MemberBatchError: Raised when only some batches of a membership change were applied.
+
+Functions:
+    - default_client: Returns a GrouperClient shared by all callers, configured from the environment.
 
 Environment Variables:
     - GROUPER_API_URL: The base URL for the Grouper API.
     - GROUPER_ENTITY_ID: The entity ID used for authentication.
     - GROUPER_KEY_PATH: The file path to the private key used for generating JWT tokens.
     - GROUPER_HPC_STEM: The default stem for group operations (default: 'RTGID:app:Deploy').
+    - GROUPER_JWT_ALGORITHM: The algorithm used to sign JWT tokens (default: 'RS256').
+    - GROUPER_VALIDATE_PAYLOADS: If true, validates request payloads against their models (default: false).
 
 Dependencies:
     - jwt: Used for generating JWT tokens for authentication.
     - os: Used for accessing environment variables.
-    - datetime: Used for handling timestamps.
+    - time: Used for handling timestamps.
 
 Usage:
     Instantiate the `GrouperClient` class and use its methods to interact with the Grouper API.
 """
 import os
-import datetime
+import re
+import copy
+import time
+import uuid
+import inspect
+import logging
+import threading
+import functools
+from collections.abc import Iterable, Iterator, Mapping, Set
+from functools import partial
 import jwt
-from grouper_client.abstract_client import AbstractClient
+from cachetools import TLRUCache
+from cryptography.hazmat.primitives import serialization
+from grouper_client.abstract_client import AbstractClient, REQUEST_ERRORS, is_unavailable
 from grouper_client.models import (
+    fast_get_members_json,
     FindGroupsRequest,
-    WsRestFindGroupsRequest,
-    WsQueryFilter,
     GetGroupMembersRequest,
-    WsRestGetMembersRequest,
     AddMembersRequest,
-    WsRestAddMemberRequest,
     RemoveMembersRequest,
-    WsRestDeleteMemberRequest,
+    HasMemberRequest,
     GetGroupsForUserRequest,
-    WsRestGetGroupsRequest,
     GetUsersRequest,
-    WsRestGetSubjectsRequest,
     SaveGroupRequest,
-    WsRestGroupSaveRequest,
-    DeleteGroupRequest,
-    WsRestGroupDeleteRequest
+    DeleteGroupRequest
 )
 
 
+logger = logging.getLogger('grouper_client')
+
 GROUPER_API_URL = os.getenv('GROUPER_API_URL', None)
 GROUPER_ENTITY_ID = os.getenv('GROUPER_ENTITY_ID', None)
 GROUPER_KEY_PATH = os.getenv('GROUPER_KEY_PATH', None)
 GROUPER_HPC_STEM = os.getenv('GROUPER_HPC_STEM', None)
+GROUPER_JWT_ALGORITHM = os.getenv('GROUPER_JWT_ALGORITHM', 'RS256')
+# when set, every request payload is validated against its pydantic model before it is sent
+GROUPER_VALIDATE_PAYLOADS = os.getenv('GROUPER_VALIDATE_PAYLOADS', 'False').lower() in ['true', '1', 'yes']
+
+# seconds a signed JWT is reused before a new one is generated, and how close
+# to that expiry a token is considered stale
+TOKEN_LIFETIME = 600
+TOKEN_EXPIRY_SKEW = 30
+
+# maximum number of subject lookups sent in a single request
+SUBJECT_BATCH_SIZE = 500
+
+# maximum number of group lookups sent in a single request
+GROUP_BATCH_SIZE = 100
+
+# maximum number of members added or removed in a single request. Failed requests are
+# already retried at the connection layer, so failed batches are not retried again.
+MEMBER_BATCH_SIZE = 500
+
+# seconds that the responses of read-only lookups are cached for. Group ids rarely
+# change so they are kept longer, while lookups that found nothing are kept for a
+# shorter time so that newly created groups and users are picked up quickly.
+RESPONSE_CACHE_TTL = 30
+# group members and the groups of a member are only cached when asked for, since
+# changes made outside this client would otherwise go unnoticed until the entry expires
+MEMBERSHIP_CACHE_TTL = 0
+GROUP_CACHE_TTL = 60
+NOT_FOUND_CACHE_TTL = 5
+RESPONSE_CACHE_SIZE = 512
+# with cache_fallback enabled, seconds past their expiry that cached responses are
+# kept around to be returned when Grouper cannot be reached
+STALE_CACHE_TTL = 3600
+
+# cached read methods whose first argument is a group name, and the cached read
+# methods whose answers change when group memberships do
+_GROUP_READS = frozenset(['get_group', 'get_group_id', 'group_exists', 'get_group_members'])
+_MEMBERSHIP_READS = frozenset(['get_group_members', 'get_groups_for_member'])
+
+# a username in parentheses within a subject description, at least three characters long
+_USERNAME_RE = re.compile(r'\(([^)]{3,})\)')
+
+
+# the fixed part of the query filter used to list the groups under a stem. Request
+# payloads are built as dict literals, merging in constants like this one, so that
+# no shared template has to be copied before the varying fields are filled in.
+_FIND_BY_STEM_FILTER = {
+    "typeOfGroups": "group",
+    "sortString": "extension",
+    "ascending": "T",
+    "queryFilterType": "FIND_BY_STEM_NAME",
+    "stemNameScope": "ALL_IN_SUBTREE",
+    "enabled": "T"
+}
+
+
+class GroupMembers(dict):
+    """
+    The members of a group, as returned by get_group_members. keys are member ids,
+    values are usernames.
+    """
+
+    @functools.cached_property
+    def usernames(self):
+        """
+        The usernames of the members, for constant time membership checks.
+        Computed on first access, so it does not reflect later changes to the dict.
+        """
+        return frozenset(self.values())
+
+
+class MemberBatchError(Exception):
+    """
+    Raised by add_members_to_group and remove_members_from_group when some batches of
+    members failed after others had already been applied in Grouper.
+
+    Attributes:
+        - results (dict): The per-member results of the batches that were applied.
+        - failed (list): The member identifiers of the batches that failed.
+        - errors (list): The error raised by each failed batch.
+    """
+
+    def __init__(self, message, results, failed, errors):
+        super().__init__(message)
+        self.results = results
+        self.failed = failed
+        self.errors = errors
+
+
+def _extract_username(subject_attributes):
+    """
+    Parses the subject attributes to extract the username from the description.
+
+    :param subject_attributes: The subject attributes list.
+    :return: The extracted username or None if not found.
+    """
+    if subject_attributes is None:
+        return None
+    for s in subject_attributes:
+        if not s:
+            continue
+        # Extract the username from the string
+        # Example: "Eileen Dover (edover02)"
+        # We want to extract "edover02"
+        match = _USERNAME_RE.search(s)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _chunks(items, size):
+    """Splits a sequence into consecutive lists of at most size elements."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _freeze(value):
+    """
+    Returns a hashable equivalent of a method argument for use in a cache key:
+    sets become frozensets, mappings frozensets of their items, and other iterables tuples.
+    """
+    if isinstance(value, (str, bytes)):
+        return value
+    if isinstance(value, Mapping):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, Set):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, Iterable):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _copy_result(value):
+    """
+    Returns a copy of a cached response, so that a caller that changes the value it was
+    given does not change what later lookups return.
+    """
+    if isinstance(value, GroupMembers):
+        # member ids and usernames are strings, so a shallow copy is enough
+        return copy.copy(value)
+    return copy.deepcopy(value)
+
+
+def _cached_read(method):
+    """
+    Caches the return value of a read-only GrouperClient method in the client's
+    response cache, keyed on the method name and its arguments. Errors are not cached.
+    Arguments are bound to the method's parameters, defaults included, so a lookup is
+    cached once however it is called, and the first element after the method name is
+    always the method's first argument, e.g. the group name.
+    Callers are given a copy of the cached value.
+    If the client has cache_fallback enabled and the request fails because Grouper is
+    unavailable (a connection error, a timeout or a 5xx status), the last response for the
+    same arguments is returned instead, even if it has expired. Other errors, e.g. a 403, are raised.
+    """
+    name = method.__name__
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        for param, value in bound.arguments.items():
+            if isinstance(value, Iterator):
+                # an iterator can only be read once, for the key or by the method
+                bound.arguments[param] = list(value)
+        key = (name,) + tuple(_freeze(v) for v in list(bound.arguments.values())[1:])
+        with self._cache_lock:
+            try:
+                return _copy_result(self._cache[key])
+            except KeyError:
+                pass
+        try:
+            result = method(*bound.args, **bound.kwargs)
+        except REQUEST_ERRORS as e:
+            if self._stale_cache is None or not is_unavailable(e):
+                raise
+            with self._cache_lock:
+                try:
+                    result = self._stale_cache[key]
+                except KeyError:
+                    raise e from None
+            logger.warning("%s failed (%s), returning a previously cached response", name, e)
+            return _copy_result(result)
+        with self._cache_lock:
+            self._cache[key] = result
+            if self._stale_cache is not None:
+                self._stale_cache[key] = result
+        return _copy_result(result)
+    return wrapper
+
+
+def _prepare_payload(model, payload):
+    """
+    Returns the payload to send for a request. Payloads are built as plain dicts;
+    they are only run through their pydantic model when GROUPER_VALIDATE_PAYLOADS is set,
+    in which case the model's serialized JSON body is returned.
+    """
+    if GROUPER_VALIDATE_PAYLOADS:
+        return model.model_validate(payload).model_dump_json(exclude_unset=True, exclude_none=True).encode()
+    return payload
 
 
 class GrouperClient(AbstractClient):
@@ -67,22 +279,31 @@ class GrouperClient(AbstractClient):
         - url (str): The base URL for the Grouper API.
         - entity_id (str): The entity ID used for authentication.
         - key_path (str): The file path to the private key used for generating JWT tokens.
+        - algorithm (str): The algorithm used to sign JWT tokens.
         - stem (str): The default stem for group operations.
         - refresh_token (str): A placeholder for refresh tokens (not used in this implementation).
 
     Methods:
         - renew_token: Renews the JWT token used for authentication.
         - get_groups: Retrieves a list of groups under a specific stem.
+        - get_all_groups: Retrieves every group under a stem, fetching pages concurrently.
+        - iter_groups: Yields every group under a stem, prefetching the next page.
         - get_group_members: Retrieves the members of a specific group.
+        - get_group_members_bulk: Retrieves the members of several groups in one request.
         - is_user_in_group: Checks if a specific user is a member of a given group.
+        - bulk_is_user_in_group: Checks the membership of several users in a group concurrently.
         - get_group: Retrieves the group object for a given group name.
+        - get_groups_bulk: Retrieves the group objects for several group names in one request.
         - get_group_id: Retrieves the unique ID of a specific group.
         - group_exists: Checks if a specific group exists.
+        - invalidate_group: Removes a group from the response cache.
+        - clear_cache: Empties the response cache.
         - add_members_to_group: Adds members to a specific group.
         - get_groups_for_member: Retrieves the groups a specific member belongs to.
         - remove_members_from_group: Removes members from a specific group.
         - extract_username: Parses subject attributes to extract a username.
         - get_users_by_id: Retrieves detailed information about specific users by ID.
+        - get_users_by_id_bulk: Retrieves users for several lists of IDs concurrently.
         - get_users_by_username: Retrieves detailed information about specific users by username.
         - user_exists: Checks if a specific user exists in Grouper.
         - create_group: Creates a new group.
@@ -92,14 +313,32 @@ class GrouperClient(AbstractClient):
         Instantiate the `GrouperClient` class with the required parameters and use its 
         methods to interact with the Grouper API.
     """
+    __slots__ = ('entity_id', 'key_path', 'stem', 'algorithm', 'cache_ttl', 'membership_ttl', 'stale_ttl',
+                 '_private_key', '_token_expiry', '_token_lock', '_cache', '_stale_cache', '_cache_lock',
+                 '_stem_prefix', '_qual')
+
     def __init__(self, base_url=GROUPER_API_URL, entity_id=GROUPER_ENTITY_ID,
-                 key_path=GROUPER_KEY_PATH, stem=GROUPER_HPC_STEM):
+                 key_path=GROUPER_KEY_PATH, stem=GROUPER_HPC_STEM, http2=False,
+                 algorithm=GROUPER_JWT_ALGORITHM, cache_ttl=RESPONSE_CACHE_TTL,
+                 cache_fallback=False, stale_ttl=STALE_CACHE_TTL, membership_ttl=MEMBERSHIP_CACHE_TTL):
         """
         Initializes the GrouperClient with the provided parameters or environment variables.
         :param base_url: The base URL for the Grouper API. 
         :param entity_id: The entity ID used for authentication. Get this from Grouper.
         :param key_path: The file path to the private key used for generating JWT tokens. 
         :param stem: The default stem for group operations. e.g. 'RTGID:app:Deploy'
+        :param http2: If True, sends requests over HTTP/2 using httpx. Requires the http2 extra.
+        :param algorithm: The JWT signing algorithm, matching the type of the private key.
+            e.g. 'RS256' for an RSA key or 'ES256' for a P-256 elliptic curve key.
+        :param cache_ttl: The number of seconds that read-only lookups are cached for. 0 disables the cache.
+        :param cache_fallback: If True, a read-only lookup that fails because Grouper cannot be
+            reached, times out or answers with a 5xx status returns the last response for the
+            same arguments instead of raising.
+        :param stale_ttl: With cache_fallback, the number of seconds past their expiry that
+            cached responses can still be returned.
+        :param membership_ttl: The number of seconds that get_group_members and get_groups_for_member
+            are cached for. 0, the default, always asks Grouper. A cached membership does not see
+            changes made outside this client until it expires.
         :return: None
         :raises ValueError: If any of the required parameters are missing."""
         if base_url is None or entity_id is None or key_path is None or stem is None:
@@ -107,26 +346,91 @@ class GrouperClient(AbstractClient):
                              "Alternatively, the "
                              "GROUPER_API_URL, GROUPER_ENTITY_ID, GROUPER_KEY_PATH, and GROUPER_HPC_STEM "
                              "environment variables may be set.")
+        super().__init__(http2=http2)
         self.url = base_url if base_url.endswith('/') else base_url + '/'
         self.entity_id = entity_id
         self.key_path = key_path
         self.stem = stem
+        self.algorithm = algorithm
         self.refresh_token = 'NA'
+        # parsing the PEM is costlier than signing, so the key is loaded once up front
+        with open(self.key_path, 'rb') as f:
+            self._private_key = serialization.load_pem_private_key(f.read(), password=None)
+        self._token_expiry = 0
+        self._token_lock = threading.Lock()
+        # responses of the read-only lookups, see _cached_read
+        self.cache_ttl = cache_ttl
+        self.membership_ttl = membership_ttl
+        self._cache = TLRUCache(maxsize=RESPONSE_CACHE_SIZE, ttu=self.__cache_expiry)
+        self.stale_ttl = stale_ttl
+        self._stale_cache = (TLRUCache(maxsize=RESPONSE_CACHE_SIZE, ttu=self.__stale_cache_expiry)
+                             if cache_fallback else None)
+        self._cache_lock = threading.Lock()
+        # the stem does not change after construction, so qualified names can be reused
+        self._stem_prefix = self.stem + ':'
+        self._qual = functools.lru_cache(maxsize=1024)(self._stem_prefix.__add__)
+
+    def __cache_expiry(self, key, value, now):
+        """
+        Returns the time at which a response cache entry expires.
+        :param key: The cache key. The first element is the name of the cached method.
+        :param value: The cached value.
+        :param now: The current time.
+        :return: The expiry time.
+        """
+        if self.cache_ttl <= 0:
+            return now
+        if key[0] in _MEMBERSHIP_READS:
+            return now + self.membership_ttl
+        if key[0] in ('group_exists', 'user_exists') and not value:
+            return now + min(NOT_FOUND_CACHE_TTL, self.cache_ttl)
+        if key[0] == 'get_group_id':
+            return now + max(GROUP_CACHE_TTL, self.cache_ttl)
+        return now + self.cache_ttl
+
+    def __stale_cache_expiry(self, key, value, now):
+        return self.__cache_expiry(key, value, now) + self.stale_ttl
 
     def renew_token(self, refresh_token='NA'):
         """
-        Renews the JWT token used for authentication.
+        Renews the JWT token used for authentication. A previously signed token is
+        reused until it is close to expiring.
 
         :param refresh_token: this service does not use refresh tokens, so this argument is ignored.
         :return: None
         """
-        with open(self.key_path, encoding='utf-8') as f:
-            key = f.read()
+        if self.__token_is_fresh():
+            return
+        with self._token_lock:
+            if self.__token_is_fresh():
+                return
+            # iat only has a resolution of one second, and RS256 signatures are deterministic,
+            # so a unique jti keeps a token renewed within the same second from repeating
             encoded_jwt = jwt.encode({
-                "iat": datetime.datetime.now(datetime.timezone.utc).timestamp()
-            }, key, algorithm="RS256")
+                "iat": int(time.time()),
+                "jti": uuid.uuid4().hex
+            }, self._private_key, algorithm=self.algorithm)
 
             self.token = f"jwtUser_{self.entity_id}_{encoded_jwt}"
+            self._token_expiry = time.monotonic() + TOKEN_LIFETIME
+
+    def __token_is_fresh(self):
+        return self.token is not None and time.monotonic() < self._token_expiry - TOKEN_EXPIRY_SKEW
+
+    def _ensure_token(self):
+        # renew_token returns straight away while the cached token is fresh, so it is
+        # called before every request to avoid ever sending an expired token
+        self.renew_token()
+
+    def invalidate_token(self):
+        """
+        Discards the cached JWT token so that the next request signs a new one.
+
+        :return: None
+        """
+        with self._token_lock:
+            self.token = None
+            self._token_expiry = 0
 
     def get_groups(self, page_number=1, page_size=10000, stem=None, details=False):
         """
@@ -140,117 +444,325 @@ class GrouperClient(AbstractClient):
         """
         if stem is None:
             stem = self.stem
-        payload = FindGroupsRequest(WsRestFindGroupsRequest=WsRestFindGroupsRequest(
-            wsQueryFilter=WsQueryFilter(
-                typeOfGroups='group',
-                pageSize=page_size,
-                pageNumber=page_number,
-                sortString='extension',
-                ascending=True,
-                queryFilterType='FIND_BY_STEM_NAME',
-                stemName=stem,
-                stemNameScope='ALL_IN_SUBTREE',
-                enabled=True
-            ),
-            includeGroupDetail=True
-        ))
-        r = self._send_post_request("groups", payload.model_dump(exclude_unset=True))
-        r = r['WsFindGroupsResults']['groupResults']
+        r = self.__get_group_page(page_number, page_size, stem)
         if not details:
             return [i['extension'] for i in r]
         else:
             return r
 
-    def get_group_members(self, group_name) -> dict:
+    def get_all_groups(self, stem=None, details=False, page_size=1000, concurrency=4):
+        """
+        Returns every group with the given stem. After the first page, pages are
+        requested concurrency at a time until a page comes back short.
+        :param stem: The stem to return groups from. If None, the default stem is used.
+        :param details: If True, returns the full group details.
+            If False, returns only the group names.
+        :param page_size: The number of groups to request per page.
+        :param concurrency: The number of pages requested at once.
+        :return: A list of all groups with the given stem.
+        """
+        if stem is None:
+            stem = self.stem
+        fetch_page = partial(self.__get_group_page, page_size=page_size, stem=stem)
+        groups = fetch_page(1)
+        last_page_full = len(groups) == page_size
+        next_page = 2
+        while last_page_full:
+            page_numbers = range(next_page, next_page + concurrency)
+            for page in self._fan_out(fetch_page, page_numbers):
+                groups.extend(page)
+                last_page_full = len(page) == page_size
+                if not last_page_full:
+                    break
+            next_page += concurrency
+        if not details:
+            return [i['extension'] for i in groups]
+        return groups
+
+    def iter_groups(self, stem=None, details=False, page_size=1000):
+        """
+        Yields every group with the given stem, one page at a time. While the groups
+        of one page are being consumed, the next page is already being requested.
+        :param stem: The stem to return groups from. If None, the default stem is used.
+        :param details: If True, yields the full group details.
+            If False, yields only the group names.
+        :param page_size: The number of groups to request per page.
+        :return: A generator of the groups with the given stem.
+        """
+        if stem is None:
+            stem = self.stem
+        fetch_page = partial(self.__get_group_page, page_size=page_size, stem=stem)
+        page_number = 1
+        next_page = self._submit(fetch_page, page_number)
+        while next_page is not None:
+            page = next_page.result()
+            page_number += 1
+            next_page = self._submit(fetch_page, page_number) if len(page) == page_size else None
+            for group in page:
+                yield group if details else group['extension']
+
+    def __get_group_page(self, page_number, page_size, stem):
+        """
+        Requests a single page of groups under a stem.
+        :param page_number: The page number to return.
+        :param page_size: The number of groups per page.
+        :param stem: The stem to return groups from.
+        :return: The list of group results on the page.
         """
-        Returns a list of members in the given group.
+        payload = {
+            "WsRestFindGroupsRequest": {
+                "wsQueryFilter": {
+                    **_FIND_BY_STEM_FILTER,
+                    "pageSize": page_size,
+                    "pageNumber": page_number,
+                    "stemName": stem
+                },
+                "includeGroupDetail": "T"
+            }
+        }
+        r = self._send_post_request("groups", _prepare_payload(FindGroupsRequest, payload))
+        return r['WsFindGroupsResults'].get('groupResults', [])
+
+    @_cached_read
+    def get_group_members(self, group_name) -> GroupMembers:
+        """
+        Returns a list of members in the given group. The result is only cached if the client
+        was created with a membership_ttl, in which case members added or removed outside this
+        client are not seen until the cached result expires.
         :param group_name: The name of the group to return members from.
-        :return: A dict of members in the group. keys are member ids, values are usernames.
-        """
-        payload = GetGroupMembersRequest(
-            WsRestGetMembersRequest=WsRestGetMembersRequest(
-                includeSubjectDetail=True,
-                wsGroupLookups=[{"groupName": self.get_qualified_groupname(group_name)}]
-        ))
-        resp = self._send_post_request("groups", payload.model_dump(exclude_unset=True))
-        return self.__handle_get_group_members_response(resp)
- 
-    def __handle_get_group_members_response(self, response):
-        """
-        Handles the response from the Grouper API for group members.
-        :param response: The response from the Grouper API.
-        :return: A dictionary of members in the group. keys are member ids, values are usernames.
+        :return: A GroupMembers dict of members in the group. keys are member ids, values are usernames.
+            Its usernames attribute is a frozenset of the usernames.
         """
-        results = response['WsGetMembersResults']['results']
-        if len(results) == 0 or 'wsSubjects' not in results[0]:
-            return {}
-        resp = results[0]['wsSubjects']
+        return self.__get_group_members(group_name)
 
-        return {i['id']: GrouperClient.extract_username(i['attributeValues'])
-                for i in resp if i['resultCode'] == 'SUCCESS'}
+    def __get_group_members(self, group_name):
+        if GROUPER_VALIDATE_PAYLOADS:
+            payload = _prepare_payload(GetGroupMembersRequest, {
+                "WsRestGetMembersRequest": {
+                    "includeSubjectDetail": "T",
+                    "wsGroupLookups": [{"groupName": self._qual(group_name)}]
+                }
+            })
+        else:
+            payload = fast_get_members_json(self._qual(group_name))
+        # large groups are parsed as the response arrives when ijson is installed
+        subjects = self._stream_post_items("groups", payload, 'WsGetMembersResults.results.item.wsSubjects.item')
+        return GroupMembers({i['id']: _extract_username(i['attributeValues'])
+                             for i in subjects if i['resultCode'] == 'SUCCESS'})
+
+    def get_group_members_bulk(self, group_names, batch_size=GROUP_BATCH_SIZE) -> dict:
+        """
+        Returns the members of several groups. The groups are looked up together,
+        batch_size groups per request, and the batches are sent concurrently.
+        :param group_names: The names of the groups to return members from.
+        :param batch_size: The maximum number of groups looked up per request.
+        :return: A dict keyed by group name. values are GroupMembers dicts of member ids to usernames.
+        """
+        members = {}
+        for found in self._fan_out(self.__get_group_members_batch, _chunks(list(group_names), batch_size)):
+            members.update(found)
+        return members
+
+    def __get_group_members_batch(self, group_names):
+        payload = {
+            "WsRestGetMembersRequest": {
+                "includeSubjectDetail": "T",
+                "wsGroupLookups": [{"groupName": self._qual(g)} for g in group_names]
+            }
+        }
+        resp = self._send_post_request("groups", _prepare_payload(GetGroupMembersRequest, payload))
+        # Grouper returns one result per group lookup, in the order they were sent
+        results = resp['WsGetMembersResults']['results']
+        return {g: self.__handle_get_group_members_result(r) for g, r in zip(group_names, results)}
+
+    def __handle_get_group_members_result(self, result):
+        """
+        Handles a single group's result from the Grouper API for group members.
+        :param result: The result for the group from the Grouper API response.
+        :return: A GroupMembers dict of the members in the group. keys are member ids, values are usernames.
+        """
+        if 'wsSubjects' not in result:
+            return GroupMembers()
+        return GroupMembers({i['id']: _extract_username(i['attributeValues'])
+                             for i in result['wsSubjects'] if i['resultCode'] == 'SUCCESS'})
 
-    def is_user_in_group(self, group_name, user_uid):
+    def is_user_in_group(self, group_name, user_uid, use_has_member=True):
         """
-        Checks if a specific user is a member of a given group.
+        Checks if a specific user is a member of a given group. The answer is not cached;
+        Grouper is asked every time.
 
         :param group_name: The name of the group to check.
         :param user_uid: The unique identifier of the user.
+        :param use_has_member: If True, asks Grouper directly whether the user is a member.
+            If False, fetches all members of the group and searches them instead, for
+            servers that do not support the hasMember operation.
         :return: True if the user is in the group, False otherwise.
         """
-        return user_uid in self.get_group_members(group_name).values()
+        if not use_has_member:
+            return user_uid in self.__get_group_members(group_name).usernames
+        payload = {
+            "WsRestHasMemberRequest": {
+                "wsGroupLookup": {"groupName": self._qual(group_name)},
+                "subjectLookups": [{"subjectIdentifier": user_uid}]
+            }
+        }
+        resp = self._send_post_request("groups", _prepare_payload(HasMemberRequest, payload))
+        return self.__handle_has_member_response(resp)
+
+    def bulk_is_user_in_group(self, group_name, user_uids):
+        """
+        Checks whether each of several users is a member of a given group,
+        running the checks concurrently.
+
+        :param group_name: The name of the group to check.
+        :param user_uids: The unique identifiers of the users.
+        :return: A dict keyed by user identifier. values are True if the user is in the group.
+        """
+        user_uids = list(user_uids)
+        return dict(zip(user_uids, self._fan_out(partial(self.is_user_in_group, group_name), user_uids)))
 
+    def __handle_has_member_response(self, response):
+        """
+        Handles the response from the Grouper API for a membership check.
+        :param response: The response from the Grouper API.
+        :return: True if the subject is a member of the group, False otherwise.
+        """
+        if 'WsHasMemberResults' not in response or 'results' not in response['WsHasMemberResults']:
+            raise ValueError(f"Unexpected response from Grouper when checking group membership: {response}")
+        results = response['WsHasMemberResults']['results']
+        return (len(results) > 0
+                and results[0]['resultMetadata']['success'] == 'T'
+                and results[0]['resultMetadata']['resultCode'] == 'IS_MEMBER')
+
+    @_cached_read
     def get_group(self, group_name):
         """
-        Returns the group object for the given group name.
+        Returns the group object for the given group name. The result is cached for cache_ttl seconds.
         :param group_name: The name of the group to return.
         :return: The group object for the given group name.
         """
-        payload = FindGroupsRequest(WsRestFindGroupsRequest=WsRestFindGroupsRequest(
-            wsQueryFilter=WsQueryFilter(
-                groupName=self.get_qualified_groupname(group_name),
-                queryFilterType='FIND_BY_GROUP_NAME_EXACT'
-            )
-        ))
+        return self.__find_group(group_name)
+
+    def __find_group(self, group_name):
+        payload = {
+            "WsRestFindGroupsRequest": {
+                "wsQueryFilter": {
+                    "groupName": self._qual(group_name),
+                    "queryFilterType": "FIND_BY_GROUP_NAME_EXACT"
+                }
+            }
+        }
+        return self._send_post_request("groups", _prepare_payload(FindGroupsRequest, payload))['WsFindGroupsResults']
+
+    def get_groups_bulk(self, group_names, batch_size=GROUP_BATCH_SIZE):
+        """
+        Returns the group objects for several group names. The groups are looked up
+        together, batch_size groups per request, and the batches are sent concurrently.
+        :param group_names: The names of the groups to return.
+        :param batch_size: The maximum number of groups looked up per request.
+        :return: A dict keyed by group name. values are the group objects, or None
+            for groups that do not exist.
+        """
+        group_names = list(group_names)
+        found = {}
+        for groups in self._fan_out(self.__find_groups_batch, _chunks(group_names, batch_size)):
+            found.update((g['name'], g) for g in groups)
+        return {g: found.get(self._qual(g)) for g in group_names}
 
-        return self._send_post_request("groups", payload.model_dump(exclude_unset=True))['WsFindGroupsResults']
+    def __find_groups_batch(self, group_names):
+        payload = {
+            "WsRestFindGroupsRequest": {
+                "wsGroupLookups": [{"groupName": self._qual(g)} for g in group_names]
+            }
+        }
+        r = self._send_post_request("groups", _prepare_payload(FindGroupsRequest, payload))
+        return r['WsFindGroupsResults'].get('groupResults', [])
 
+    @_cached_read
     def get_group_id(self, group_name):
         """
-        Returns the group id for the given group name.
+        Returns the group id for the given group name. Ids are cached for at least GROUP_CACHE_TTL seconds.
         :param group_name: The name of the group to return the id for.
         :return: The group id for the given group name.
         """
-        return self.get_group(group_name)['groupResults'][0]['uuid']
+        return self.__find_group(group_name)['groupResults'][0]['uuid']
 
+    @_cached_read
     def group_exists(self, group_name):
         """
-        Checks if a specific group exists.
+        Checks if a specific group exists. The answer is cached for cache_ttl seconds
+        if the group exists and at most NOT_FOUND_CACHE_TTL seconds if it does not.
 
         :param group_name: The name of the group to check.
         :return: True if the group exists, False otherwise.
         """
         try:
-            response = self.get_group(group_name)
-            return len(response['groupResults']) > 0
+            results = self.__find_group(group_name)['groupResults']
         except KeyError:
-            return False
+            results = []
+        return len(results) > 0
 
-    def add_members_to_group(self, group_name, member_uids: list):
+    def invalidate_group(self, group_name, members_only=False):
         """
-        Adds members to a specific group.
+        Removes a group from the response cache, so that the next lookup of the group
+        asks Grouper again.
+
+        :param group_name: The name of the group.
+        :param members_only: If True, only the cached membership of the group is removed,
+            along with the cached groups of every member.
+        :return: None
+        """
+        names = _MEMBERSHIP_READS if members_only else _GROUP_READS | _MEMBERSHIP_READS
+        with self._cache_lock:
+            for cache in self.__caches():
+                outdated = [k for k in cache.keys()
+                            if k[0] in names and (k[0] == 'get_groups_for_member' or k[1] == group_name)]
+                for k in outdated:
+                    cache.pop(k, None)
+
+    def clear_cache(self):
+        """
+        Empties the response cache.
+
+        :return: None
+        """
+        with self._cache_lock:
+            for cache in self.__caches():
+                cache.clear()
+
+    def __caches(self):
+        if self._stale_cache is None:
+            return [self._cache]
+        return [self._cache, self._stale_cache]
+
+    def add_members_to_group(self, group_name, member_uids: list,
+                             batch_size=MEMBER_BATCH_SIZE, concurrency=4):
+        """
+        Adds members to a specific group. Large lists are split into batches of batch_size
+        members which are sent concurrently.
 
         :param group_name: The name of the group.
         :param member_uids: A list of member unique identifiers to add.
+        :param batch_size: The maximum number of members sent per request.
+        :param concurrency: The maximum number of batches in flight at once.
         :return: A list of dictionaries indicating the success status for each member.
+        :raises MemberBatchError: If some batches failed after others were applied.
         """
-        payload = AddMembersRequest(
-            WsRestAddMemberRequest=WsRestAddMemberRequest(
-                wsGroupLookup={"groupName": self.get_qualified_groupname(group_name)},
-                subjectLookups=[{"subjectIdentifier": m} for m in member_uids],
-                replaceAllExisting=False
-        ))
+        try:
+            return self.__send_member_batches(self.__add_members_batch, group_name, member_uids,
+                                              batch_size, concurrency)
+        finally:
+            self.invalidate_group(group_name, members_only=True)
 
-        resp = self._send_post_request("groups", payload.model_dump(exclude_unset=True))
+    def __add_members_batch(self, group_name, member_uids):
+        payload = {
+            "WsRestAddMemberRequest": {
+                "wsGroupLookup": {"groupName": self._qual(group_name)},
+                "subjectLookups": [{"subjectIdentifier": m} for m in member_uids],
+                "replaceAllExisting": "F"
+            }
+        }
+        resp = self._send_post_request("groups", _prepare_payload(AddMembersRequest, payload))
         return self.__handle_add_members_response(resp)
     
     def __handle_add_members_response(self, response):
@@ -265,37 +777,52 @@ class GrouperClient(AbstractClient):
         return {i['wsSubject']['identifierLookup']: i['wsSubject']['resultCode'] == 'SUCCESS'
                 for i in resp}
 
+    @_cached_read
     def get_groups_for_member(self, member_id):
         """
-        Retrieves the groups a specific member belongs to.
+        Retrieves the groups a specific member belongs to. The result is only cached if the client
+        was created with a membership_ttl, in which case membership changes made outside this
+        client are not seen until the cached result expires.
 
         :param member_id: The unique identifier of the member.
         :return: The response from the Grouper API containing group details.
         """
-        payload = GetGroupsForUserRequest(
-            WsRestGetGroupsRequest=WsRestGetGroupsRequest(
-                subjectLookups=[{"subjectId": member_id}],
-                subjectAttributeNames=["description"]
-        ))
-
-        resp = self._send_post_request("subjects", payload.model_dump(exclude_unset=True))['WsGetGroupsResults']
+        payload = {
+            "WsRestGetGroupsRequest": {
+                "subjectLookups": [{"subjectId": member_id}],
+                "subjectAttributeNames": ["description"]
+            }
+        }
+        resp = self._send_post_request("subjects", _prepare_payload(GetGroupsForUserRequest, payload))['WsGetGroupsResults']
         return resp
 
-    def remove_members_from_group(self, group_name, member_uids: list):
+    def remove_members_from_group(self, group_name, member_uids: list,
+                                  batch_size=MEMBER_BATCH_SIZE, concurrency=4):
         """
-        Removes members from a specific group.
+        Removes members from a specific group. Large lists are split into batches of batch_size
+        members which are sent concurrently.
 
         :param group_name: The name of the group.
         :param member_uids: A list of member unique identifiers to remove.
+        :param batch_size: The maximum number of members sent per request.
+        :param concurrency: The maximum number of batches in flight at once.
         :return: A list of dictionaries indicating the success status for each member.
+        :raises MemberBatchError: If some batches failed after others were applied.
         """
-        payload = RemoveMembersRequest(
-            WsRestDeleteMemberRequest=WsRestDeleteMemberRequest(
-                wsGroupLookup={"groupName": self.get_qualified_groupname(group_name)},
-                subjectLookups=[{"subjectIdentifier": m} for m in member_uids]
-        ))
+        try:
+            return self.__send_member_batches(self.__remove_members_batch, group_name, member_uids,
+                                              batch_size, concurrency)
+        finally:
+            self.invalidate_group(group_name, members_only=True)
 
-        resp = self._send_delete_request("groups", payload.model_dump(exclude_unset=True))
+    def __remove_members_batch(self, group_name, member_uids):
+        payload = {
+            "WsRestDeleteMemberRequest": {
+                "wsGroupLookup": {"groupName": self._qual(group_name)},
+                "subjectLookups": [{"subjectIdentifier": m} for m in member_uids]
+            }
+        }
+        resp = self._send_delete_request("groups", _prepare_payload(RemoveMembersRequest, payload))
         return self.__handle_remove_members_response(resp)
     
     def __handle_remove_members_response(self, response):
@@ -311,44 +838,101 @@ class GrouperClient(AbstractClient):
         except KeyError:
             return resp
 
+    def __send_member_batches(self, send_batch, group_name, member_uids, batch_size, concurrency):
+        """
+        Sends member changes for a group in batches. Every batch is sent, even if another fails.
+        :param send_batch: The method that sends a single batch.
+        :param group_name: The name of the group.
+        :param member_uids: A list of member unique identifiers.
+        :param batch_size: The maximum number of members sent per request.
+        :param concurrency: The maximum number of batches in flight at once.
+        :return: The merged responses of all batches.
+        :raises MemberBatchError: If some batches failed after others were applied.
+        :raises: The error of the last batch, if every batch failed.
+        """
+        batches = _chunks(list(member_uids), batch_size) or [[]]
+        outcomes = self._fan_out(partial(self.__try_batch, send_batch, group_name), batches,
+                                 max_workers=concurrency)
+        results = [result for result, error in outcomes if error is None]
+        errors = [error for result, error in outcomes if error is not None]
+        if errors and not results:
+            # nothing was applied, so the error is raised as it is
+            raise errors[-1]
+        if len(results) == 1:
+            merged = results[0]
+        else:
+            merged = {}
+            for result in results:
+                merged.update(result)
+        if errors:
+            failed = [m for batch, (result, error) in zip(batches, outcomes) if error is not None for m in batch]
+            raise MemberBatchError(f"{len(errors)} of {len(batches)} member batches for group {group_name} "
+                                   f"failed: {errors[-1]}", merged, failed, errors) from errors[-1]
+        return merged
+
     @staticmethod
-    def extract_username(subject_attributes):
-        """
-        Parses the subject attributes to extract the username from the description.
-
-        :param subject_attributes: The subject attributes list.
-        :return: The extracted username or None if not found.
-        """
-        if subject_attributes is None:
-            return None
-        for s in subject_attributes:
-            if "(" in s and ")" in s:
-                # Extract the username from the string
-                # Example: "Eileen Dover (edover02)"
-                # We want to extract "edover02"
-                result = s[s.find("(")+1:s.find(")")]
-                if len(result) > 2:
-                    return result
-        return None
+    def __try_batch(send_batch, group_name, member_uids):
+        # a failed batch must not hide the results of the batches that were applied,
+        # so errors are returned rather than raised while the other batches run
+        try:
+            return send_batch(group_name, member_uids), None
+        except Exception as e:
+            return None, e
 
-    def get_users_by_id(self, member_ids):
+    extract_username = staticmethod(_extract_username)
+
+    @_cached_read
+    def get_users_by_id(self, member_ids, batch_size=SUBJECT_BATCH_SIZE):
         """
-        Retrieves detailed information about specific users.
+        Retrieves detailed information about specific users. Large lists are split
+        into batches of batch_size lookups which are sent concurrently. The result is
+        cached for cache_ttl seconds.
 
         :param member_ids: A list of member unique identifiers.
+        :param batch_size: The maximum number of lookups sent per request.
         :return: A list of usernames for the provided member IDs.
         :raises ValueError: If not all members are found in Grouper.
         """
-        payload = GetUsersRequest(
-            WsRestGetSubjectsRequest=WsRestGetSubjectsRequest(
-                includeSubjectDetail=True,
-                wsSubjectLookups=[{"subjectId": m} for m in member_ids]
-        ))
-
-        r = self._send_post_request("subjects", payload.model_dump(exclude_unset=True))
-        subject_list = self.__handle_get_users_response(r)
+        subject_list = self.__get_subjects("subjectId", member_ids, batch_size)
         return self.__extract_and_validate_users_found(subject_list, member_ids)
-    
+
+    def get_users_by_id_bulk(self, chunks):
+        """
+        Retrieves the usernames for several independent lists of member IDs,
+        looking the lists up concurrently.
+
+        :param chunks: An iterable of lists of member unique identifiers.
+        :return: A list with the result of get_users_by_id for each list, in order.
+        :raises ValueError: If not all members of a list are found in Grouper.
+        """
+        # large lists are themselves split across the shared pool, so the lists are
+        # spread over a dedicated pool to avoid waiting on the pool from inside it
+        return self._fan_out(self.get_users_by_id, chunks, max_workers=self.max_workers)
+
+    def __get_subjects(self, lookup_field, lookups, batch_size):
+        """
+        Looks up subjects in batches, sending the batches concurrently.
+        :param lookup_field: The subject lookup field, either subjectId or subjectIdentifier.
+        :param lookups: The values to look up.
+        :param batch_size: The maximum number of lookups sent per request.
+        :return: A dictionary of users. keys are user ids, values are usernames.
+        """
+        batches = _chunks(list(lookups), batch_size)
+        subject_list = {}
+        for found in self._fan_out(partial(self.__get_subjects_batch, lookup_field), batches):
+            subject_list.update(found)
+        return subject_list
+
+    def __get_subjects_batch(self, lookup_field, lookups):
+        payload = {
+            "WsRestGetSubjectsRequest": {
+                "includeSubjectDetail": "T",
+                "wsSubjectLookups": [{lookup_field: m} for m in lookups]
+            }
+        }
+        r = self._send_post_request("subjects", _prepare_payload(GetUsersRequest, payload))
+        return self.__handle_get_users_response(r)
+
     def __handle_get_users_response(self, response):
         """
         Handles the response from the Grouper API for user details.
@@ -356,48 +940,58 @@ class GrouperClient(AbstractClient):
         :return: A dictionary of users. keys are user ids, values are usernames.
         """
         resp = response['WsGetSubjectsResults']['wsSubjects']
-        return {i['id']: GrouperClient.extract_username(i['attributeValues'])
+        return {i['id']: _extract_username(i['attributeValues'])
                 for i in resp if i['resultCode'] == 'SUCCESS'}
     
     def __extract_and_validate_users_found(self, subject_list, member_ids):
-        if len(subject_list.items()) != len(member_ids):
+        if len(subject_list) != len(member_ids):
             raise ValueError(f"Not all members were found in grouper: {subject_list}")
-        return subject_list.values()
+        return list(subject_list.values())
 
-    def get_users_by_username(self, member_uids):
+    @_cached_read
+    def get_users_by_username(self, member_uids, batch_size=SUBJECT_BATCH_SIZE):
         """
-        Retrieves detailed information about specific users.
+        Retrieves detailed information about specific users. Large lists are split
+        into batches of batch_size lookups which are sent concurrently. The result is
+        cached for cache_ttl seconds.
 
-        :param member_ids: A list of member unique identifiers.
-        :return: A list of usernames for the provided member IDs.
+        :param member_uids: A list of member usernames.
+        :param batch_size: The maximum number of lookups sent per request.
+        :return: A list of member IDs for the provided usernames.
         :raises ValueError: If not all members are found in Grouper.
         """
-        payload = GetUsersRequest(
-            WsRestGetSubjectsRequest=WsRestGetSubjectsRequest(
-                includeSubjectDetail=True,
-                wsSubjectLookups=[{"subjectIdentifier": m} for m in member_uids]
-        ))
-
-        r = self._send_post_request("subjects", payload.model_dump(exclude_unset=True))
-        subject_list = self.__handle_get_users_response(r)
-        if len(subject_list.items()) != len(member_uids):
+        subject_list = self.__get_subjects("subjectIdentifier", member_uids, batch_size)
+        if len(subject_list) != len(member_uids):
             raise ValueError(f"Not all members were found in grouper: {subject_list}")
-        return subject_list.keys()
+        return list(subject_list.keys())
 
+    @_cached_read
     def user_exists(self, user_id):
         """
-        Checks if a specific user exists in Grouper.
+        Checks if a specific user exists in Grouper. The answer is cached for cache_ttl seconds
+        if the user exists and at most NOT_FOUND_CACHE_TTL seconds if it does not.
 
         :param user_id: The unique identifier of the user.
         :return: True if the user exists, False otherwise.
         """
-        r = self.get_users_by_username([user_id])
-        if len(r) == 0:
-            return False
-        if len(r) > 1:
-            raise ValueError(
-                f"Multiple users found with the same ID: {user_id}")
-        return True
+        return self._subject_exists(user_id)
+
+    def _subject_exists(self, subject_identifier):
+        """
+        Looks up a single subject without requesting its details.
+
+        :param subject_identifier: The identifier of the subject, e.g. a username.
+        :return: True if Grouper found the subject, False otherwise.
+        """
+        payload = {
+            "WsRestGetSubjectsRequest": {
+                "includeSubjectDetail": "F",
+                "wsSubjectLookups": [{"subjectIdentifier": subject_identifier}]
+            }
+        }
+        r = self._send_post_request("subjects", _prepare_payload(GetUsersRequest, payload))
+        subjects = r['WsGetSubjectsResults'].get('wsSubjects', [])
+        return len(subjects) > 0 and subjects[0]['resultCode'] == 'SUCCESS'
 
     def create_group(self, group_name):
         """
@@ -406,22 +1000,25 @@ class GrouperClient(AbstractClient):
         :param group_name: The name of the group to create.
         :return: True if the group was successfully created, False otherwise.
         """
-        payload = SaveGroupRequest(
-            WsRestGroupSaveRequest=WsRestGroupSaveRequest(
-                wsGroupToSaves=[
+        qualified_name = self._qual(group_name)
+        payload = {
+            "WsRestGroupSaveRequest": {
+                "wsGroupToSaves": [
                     {
                         "wsGroupLookup": {
-                            "groupName": self.get_qualified_groupname(group_name)
+                            "groupName": qualified_name
                         },
                         "wsGroup": {
                             "extension": group_name,
-                            "name": self.get_qualified_groupname(group_name)
+                            "name": qualified_name
                         }
                     }
                 ]
-        ))
-        
-        r = self._send_post_request("groups", payload.model_dump(exclude_unset=True))
+            }
+        }
+
+        r = self._send_post_request("groups", _prepare_payload(SaveGroupRequest, payload))
+        self.invalidate_group(group_name)
         return self.__result_metadata_success(r['WsGroupSaveResults']['results'])
 
     def delete_group(self, group_name):
@@ -431,11 +1028,13 @@ class GrouperClient(AbstractClient):
         :param group_name: The name of the group to delete.
         :return: True if the group was successfully deleted, False otherwise.
         """
-        payload = DeleteGroupRequest(
-            WsRestGroupDeleteRequest=WsRestGroupDeleteRequest(
-                wsGroupLookups=[{"groupName": self.get_qualified_groupname(group_name)}]
-        ))
-        r = self._send_post_request("groups", payload.model_dump(exclude_unset=True))
+        payload = {
+            "WsRestGroupDeleteRequest": {
+                "wsGroupLookups": [{"groupName": self._qual(group_name)}]
+            }
+        }
+        r = self._send_post_request("groups", _prepare_payload(DeleteGroupRequest, payload))
+        self.invalidate_group(group_name)
         return self.__result_metadata_success(r['WsGroupDeleteResults']['results'])
     
     def __result_metadata_success(self, results):
@@ -454,4 +1053,29 @@ class GrouperClient(AbstractClient):
         :param group_name: The name of the group.
         :return: The qualified group name.
         """
-        return f"{self.stem}:{group_name}"
+        return self._qual(group_name)
+
+
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    """
+    Returns a GrouperClient configured from the environment variables, creating it on
+    the first call and returning the same instance afterwards. Sharing one client lets
+    all callers reuse its pooled connections, its signed JWT and its response cache.
+
+    The client is safe to use from several threads: the connection pool is thread-safe,
+    and token renewal and the response cache are guarded by locks.
+
+    :return: The shared GrouperClient.
+    :raises ValueError: If the required environment variables are not set.
+    """
+    # lru_cache does not stop two threads from creating a client at the same time
+    with _default_client_lock:
+        return _default_client()
+
+
+@functools.lru_cache(maxsize=1)
+def _default_client():
+    return GrouperClient()
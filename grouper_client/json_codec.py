@@ -0,0 +1,19 @@
+"""
+JSON encoding and decoding shared by the HTTP client and the request models.
+orjson is used when it is installed, and the standard library json module otherwise.
+Both json_dumps and json_loads work with bytes.
+"""
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library json module is used without it
+    orjson = None
+    import json
+
+
+if orjson is not None:
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+else:
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+    json_loads = json.loads
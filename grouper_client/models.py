@@ -1,152 +1,278 @@
-from typing import Optional, Literal
-from typing_extensions import TypedDict, Self
-from pydantic import (BaseModel, ConfigDict, PositiveInt,
-                      field_serializer, model_validator)
+import sys
+import warnings
+import dataclasses
+from typing import ClassVar, Optional, Literal, Union
+from typing_extensions import Annotated
+from pydantic import (BaseModel, ConfigDict, PositiveInt, TypeAdapter,
+                      BeforeValidator, Discriminator, model_serializer, model_validator)
+from grouper_client.json_codec import json_dumps
+
+
+# the configuration shared by the request models. Requests that can carry thousands of
+# lookups do not strip whitespace from every string; their values are built by the client.
+_FROZEN_CFG = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
+_MUTABLE_CFG = ConfigDict(extra='forbid', str_strip_whitespace=True)
+_BULK_CFG = ConfigDict(extra='forbid', frozen=True)
+
+
+def _bool_to_tf(value):
+    """Grouper expects booleans as 'T' or 'F'. Converts bools once, when a model is validated."""
+    if value is True:
+        return 'T'
+    if value is False:
+        return 'F'
+    return value
+
+
+# a Grouper boolean flag. True and False are accepted and stored as 'T' and 'F'.
+TF = Annotated[Literal['T', 'F'], BeforeValidator(_bool_to_tf)]
+
+
+class GrouperRequest(BaseModel):
+    """
+    Base class of the top-level request models, e.g. FindGroupsRequest. Grouper expects
+    each request wrapped in an object with a single key naming the request type, e.g.
+    {"WsRestFindGroupsRequest": {...}}. Rather than nesting a second model for that key,
+    a request model derives from the model of the inner request and adds the key when
+    it is serialized. Wrapped input is unwrapped when it is validated.
+    A request model only has to name its inner model as a base: the wrapper key is the
+    name of that model, and its configuration is inherited.
+    """
+    wrapper_key: ClassVar[str]
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs):
+        super().__pydantic_init_subclass__(**kwargs)
+        # subclasses of a request model inherit its wrapper key
+        if not hasattr(cls, 'wrapper_key'):
+            inner = next((b for b in cls.__bases__ if issubclass(b, BaseModel) and b is not GrouperRequest), None)
+            if inner is None:
+                raise TypeError(f'{cls.__name__} must derive from an inner request model or set wrapper_key')
+            cls.wrapper_key = inner.__name__
+
+    @model_validator(mode='before')
+    @classmethod
+    def unwrap(cls, data):
+        if isinstance(data, dict) and len(data) == 1 and cls.wrapper_key in data:
+            data = data[cls.wrapper_key]
+        if isinstance(data, BaseModel) and not isinstance(data, cls):
+            # an inner request model, e.g. AddMembersRequest(WsRestAddMemberRequest=WsRestAddMemberRequest(...))
+            return {name: getattr(data, name) for name in data.model_fields_set}
+        return data
+
+    @model_serializer(mode='wrap')
+    def wrap(self, handler):
+        return {self.wrapper_key: handler(self)}
+
+
+# lookups and the other leaves of a request are frozen, slotted dataclasses rather than
+# models or dicts. slots is only available from Python 3.10.
+_lookup = dataclasses.dataclass(frozen=True, **({'slots': True} if sys.version_info >= (3, 10) else {}))
+
+
+@_lookup
+class WsGroupLookup:
+    groupName: str
 
 
-class WsQueryFilter(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True)
+class BaseQueryFilter(BaseModel):
+    """The fields shared by every find-groups query filter."""
+    model_config = _MUTABLE_CFG
     typeOfGroups: Literal['group'] = 'group'
     pageSize: Optional[PositiveInt] = None
     pageNumber: Optional[PositiveInt] = None
     sortString: Optional[str] = None
-    ascending: Optional[bool] = None
+    ascending: Optional[TF] = None
+    enabled: Optional[TF] = None
+
+
+class StemNameFilter(BaseQueryFilter):
+    queryFilterType: Literal['FIND_BY_STEM_NAME']
+    stemName: str
+    stemNameScope: Optional[Literal['ALL_IN_SUBTREE']] = None
+
+
+class GroupNameFilter(BaseQueryFilter):
+    queryFilterType: Literal['FIND_BY_GROUP_NAME_EXACT']
+    groupName: str
+
+
+# the query filter of a FindGroupsRequest. queryFilterType selects the variant, so only
+# the fields of that variant are validated.
+QueryFilter = Annotated[Union[StemNameFilter, GroupNameFilter], Discriminator('queryFilterType')]
+_query_filter = TypeAdapter(QueryFilter)
+
+
+class WsQueryFilter(BaseQueryFilter):
+    """
+    Deprecated: use StemNameFilter or GroupNameFilter, or QueryFilter in annotations.
+    The former query filter model, which has the fields of every filter type. Its fields
+    are checked against the filter for its queryFilterType, and FindGroupsRequest converts
+    it to that filter.
+    """
     queryFilterType: Literal['FIND_BY_STEM_NAME', 'FIND_BY_GROUP_NAME_EXACT']
     stemName: Optional[str] = None
     stemNameScope: Optional[Literal['ALL_IN_SUBTREE']] = None
-    enabled: Optional[bool] = None
     groupName: Optional[str] = None
 
-    @field_serializer('enabled')
-    def serialize_enabled(self, value: bool) -> str:
-        return 'T' if value else 'F'
-    
-    @field_serializer('ascending')
-    def serialize_ascending(self, value: bool) -> str:
-        return 'T' if value else 'F'
+    def __init__(self, **data):
+        warnings.warn('WsQueryFilter is deprecated, use StemNameFilter or GroupNameFilter',
+                      DeprecationWarning, stacklevel=2)
+        super().__init__(**data)
+
+    @model_validator(mode='before')
+    @classmethod
+    def check_filter_type(cls, data):
+        if isinstance(data, dict):
+            _query_filter.validate_python(data)
+        return data
+
+    def to_filter(self):
+        """
+        Returns the filter for this filter's queryFilterType.
+        :return: A StemNameFilter or a GroupNameFilter with the fields that were set.
+        """
+        return _query_filter.validate_python(self.model_dump(exclude_unset=True))
+
+
+def _from_ws_query_filter(value):
+    if isinstance(value, WsQueryFilter):
+        return value.to_filter()
+    return value
 
 
 class WsRestFindGroupsRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    wsQueryFilter: WsQueryFilter
-    includeGroupDetail: Optional[bool] = None
+    model_config = _FROZEN_CFG
+    wsQueryFilter: Optional[Annotated[QueryFilter, BeforeValidator(_from_ws_query_filter)]] = None
+    wsGroupLookups: Optional[tuple[WsGroupLookup, ...]] = None
+    includeGroupDetail: Optional[TF] = None
 
-    @field_serializer('includeGroupDetail')
-    def serialize_include_group_detail(self, value: bool) -> str:
-        return 'T' if value else 'F'
+class FindGroupsRequest(GrouperRequest, WsRestFindGroupsRequest):
+    pass
 
-class FindGroupsRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    WsRestFindGroupsRequest: WsRestFindGroupsRequest
-    
 
-class SubjectLookup(BaseModel):
+# requests can carry thousands of subject lookups
+@_lookup
+class SubjectLookup:
     subjectIdentifier: Optional[str] = None
     subjectId: Optional[str] = None
 
-    @model_validator(mode='after')
-    def check_fields(self) -> Self:
+    def __post_init__(self):
         if not (self.subjectIdentifier or self.subjectId):
             raise ValueError('Either subjectIdentifier or subjectId must be provided')
-        return self
-
 
-class WsRestGetGroupsRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    subjectLookups: list[SubjectLookup]
-    subjectAttributeNames: list[str]
+    @model_serializer(mode='plain')
+    def _drop_none(self):
+        # dataclass fields are always set, so exclude_unset keeps them. Grouper is only sent
+        # the identifiers that were given.
+        if self.subjectId is None:
+            return {'subjectIdentifier': self.subjectIdentifier}
+        if self.subjectIdentifier is None:
+            return {'subjectId': self.subjectId}
+        return {'subjectIdentifier': self.subjectIdentifier, 'subjectId': self.subjectId}
 
 
-class GetGroupsForUserRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    WsRestGetGroupsRequest: WsRestGetGroupsRequest
+class WsRestGetGroupsRequest(BaseModel):
+    model_config = _FROZEN_CFG
+    subjectLookups: tuple[SubjectLookup, ...]
+    subjectAttributeNames: tuple[str, ...]
 
 
-class WsGroupLookup(TypedDict):
-    groupName: str
+class GetGroupsForUserRequest(GrouperRequest, WsRestGetGroupsRequest):
+    pass
 
 
 class WsRestGetMembersRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    includeSubjectDetail: bool
-    wsGroupLookups: list[WsGroupLookup]
-
-    @field_serializer('includeSubjectDetail')
-    def serialize_include_subject_detail(self, value) -> str:
-        return 'T' if value else 'F'
+    model_config = _BULK_CFG
+    includeSubjectDetail: TF
+    wsGroupLookups: tuple[WsGroupLookup, ...]
 
 
-class GetGroupMembersRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    WsRestGetMembersRequest: WsRestGetMembersRequest
+class GetGroupMembersRequest(GrouperRequest, WsRestGetMembersRequest):
+    pass
 
 
 class WsRestAddMemberRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
+    model_config = _BULK_CFG
     wsGroupLookup: WsGroupLookup
-    subjectLookups: list[SubjectLookup]
-    replaceAllExisting: bool
+    subjectLookups: tuple[SubjectLookup, ...]
+    replaceAllExisting: TF
 
-    @field_serializer('replaceAllExisting')
-    def serialize_replace_all_existing(self, value) -> str:
-        return 'T' if value else 'F'
 
-
-class AddMembersRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    WsRestAddMemberRequest: WsRestAddMemberRequest
+class AddMembersRequest(GrouperRequest, WsRestAddMemberRequest):
+    pass
 
 
 class WsRestDeleteMemberRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
+    model_config = _BULK_CFG
     wsGroupLookup: WsGroupLookup
-    subjectLookups: list[SubjectLookup]
+    subjectLookups: tuple[SubjectLookup, ...]
 
 
-class RemoveMembersRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    WsRestDeleteMemberRequest: WsRestDeleteMemberRequest
+class RemoveMembersRequest(GrouperRequest, WsRestDeleteMemberRequest):
+    pass
 
 
-class WsRestGetSubjectsRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    includeSubjectDetail: bool
-    wsSubjectLookups: list[SubjectLookup]
+class WsRestHasMemberRequest(BaseModel):
+    model_config = _FROZEN_CFG
+    wsGroupLookup: WsGroupLookup
+    subjectLookups: tuple[SubjectLookup, ...]
+
 
-    @field_serializer('includeSubjectDetail')
-    def serialize_include_subject_detail(self, value) -> str:
-        return 'T' if value else 'F'
+class HasMemberRequest(GrouperRequest, WsRestHasMemberRequest):
+    pass
 
 
-class GetUsersRequest(BaseModel):
-    WsRestGetSubjectsRequest: WsRestGetSubjectsRequest
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
+class WsRestGetSubjectsRequest(BaseModel):
+    model_config = _BULK_CFG
+    includeSubjectDetail: TF
+    wsSubjectLookups: tuple[SubjectLookup, ...]
+
 
+class GetUsersRequest(GrouperRequest, WsRestGetSubjectsRequest):
+    pass
 
-class WsGroup(TypedDict):
+
+@_lookup
+class WsGroup:
     extension: str
     name: str
 
-class WsGroupToSave(TypedDict):
+
+@_lookup
+class WsGroupToSave:
     wsGroupLookup: WsGroupLookup
     wsGroup: WsGroup
 
 
 class WsRestGroupSaveRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    wsGroupToSaves: list[WsGroupToSave]
+    model_config = _FROZEN_CFG
+    wsGroupToSaves: tuple[WsGroupToSave, ...]
 
 
-class SaveGroupRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    WsRestGroupSaveRequest: WsRestGroupSaveRequest
+class SaveGroupRequest(GrouperRequest, WsRestGroupSaveRequest):
+    pass
 
 
 class WsRestGroupDeleteRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    wsGroupLookups: list[WsGroupLookup]
+    model_config = _FROZEN_CFG
+    wsGroupLookups: tuple[WsGroupLookup, ...]
+
+
+class DeleteGroupRequest(GrouperRequest, WsRestGroupDeleteRequest):
+    pass
+
+
+# the body of a GetGroupMembersRequest for a single group, the most frequent request
+_GET_MEMBERS_JSON = b'{"WsRestGetMembersRequest":{"includeSubjectDetail":"%s","wsGroupLookups":[{"groupName":%s}]}}'
 
 
-class DeleteGroupRequest(BaseModel):
-    model_config = ConfigDict(extra='forbid', str_strip_whitespace=True, frozen=True)
-    WsRestGroupDeleteRequest: WsRestGroupDeleteRequest
\ No newline at end of file
+def fast_get_members_json(group_name, include_detail=True):
+    """
+    Returns the JSON body of a GetGroupMembersRequest for a single group by filling in a
+    fixed template, without building or validating a model.
+    :param group_name: The qualified name of the group.
+    :param include_detail: If True, asks Grouper to include subject details.
+    :return: The request body as JSON bytes.
+    """
+    return _GET_MEMBERS_JSON % (b'T' if include_detail else b'F', json_dumps(group_name))
@@ -0,0 +1,70 @@
+import io
+import gzip
+import json
+import pytest
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from grouper_client.grouper_client import GrouperClient
+
+
+class FakeGrouper(HTTPAdapter):
+    """
+    Transport adapter that answers requests in place of a Grouper server. The decoded
+    body of each request is passed to handler, which returns a status code and a JSON document.
+    The bodies, Authorization headers and Content-Encoding headers of the requests are
+    recorded in order. gzip-compressed bodies are decompressed before they are decoded.
+    """
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+        self.requests = []
+        self.authorizations = []
+        self.encodings = []
+
+    def send(self, request, **kwargs):
+        body = request.body
+        encoding = request.headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        payload = json.loads(body) if body else None
+        self.requests.append(payload)
+        self.authorizations.append(request.headers.get('Authorization'))
+        self.encodings.append(encoding)
+        status, document = self.handler(payload)
+        raw = HTTPResponse(body=io.BytesIO(json.dumps(document).encode()), status=status,
+                           headers={'Content-Type': 'application/json'}, preload_content=False)
+        return self.build_response(request, raw)
+
+
+@pytest.fixture(scope='session')
+def key_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('keys') / 'grouper_ec.pem'
+    key = ec.generate_private_key(ec.SECP256R1())
+    path.write_bytes(key.private_bytes(serialization.Encoding.PEM,
+                                       serialization.PrivateFormat.PKCS8,
+                                       serialization.NoEncryption()))
+    return str(path)
+
+
+@pytest.fixture
+def grouper(key_path):
+    """
+    Returns a function that builds a GrouperClient whose requests are answered by a
+    FakeGrouper with the given handler. The client and the adapter are returned.
+    """
+    clients = []
+
+    def make(handler, **kwargs):
+        client = GrouperClient('https://grouper.example.edu/grouper-ws/servicesRest/json/v2_4_000/',
+                               'test-entity', key_path, 'test:stem', algorithm='ES256', **kwargs)
+        adapter = FakeGrouper(handler)
+        client._session.mount('https://', adapter)
+        clients.append(client)
+        return client, adapter
+
+    yield make
+    for client in clients:
+        client.close()
@@ -0,0 +1,189 @@
+import pytest
+import requests
+
+
+class Directory:
+    """A minimal Grouper: groups with members, and subjects looked up by username."""
+
+    def __init__(self):
+        self.members = {'test:stem:g': {'alice'}}
+
+    def __call__(self, payload):
+        (request_type, request), = payload.items()
+        if request_type == 'WsRestFindGroupsRequest':
+            name = request['wsQueryFilter']['groupName']
+            return 200, {'WsFindGroupsResults': {'groupResults': [
+                {'name': name, 'extension': name.rsplit(':', 1)[1], 'uuid': 'uuid-' + name}]}}
+        if request_type == 'WsRestGetMembersRequest':
+            return 200, {'WsGetMembersResults': {'results': [
+                {'wsSubjects': [{'id': 'id-' + u, 'resultCode': 'SUCCESS', 'attributeValues': [f'User ({u})']}
+                                for u in sorted(self.members[lookup['groupName']])]}
+                for lookup in request['wsGroupLookups']]}}
+        if request_type == 'WsRestAddMemberRequest':
+            added = [s['subjectIdentifier'] for s in request['subjectLookups']]
+            self.members[request['wsGroupLookup']['groupName']].update(added)
+            return 200, {'WsAddMemberResults': {'results': [
+                {'wsSubject': {'identifierLookup': u, 'resultCode': 'SUCCESS'}} for u in added]}}
+        if request_type == 'WsRestHasMemberRequest':
+            user = request['subjectLookups'][0]['subjectIdentifier']
+            code = 'IS_MEMBER' if user in self.members[request['wsGroupLookup']['groupName']] else 'IS_NOT_MEMBER'
+            return 200, {'WsHasMemberResults': {'results': [{'resultMetadata': {'success': 'T', 'resultCode': code}}]}}
+        if request_type == 'WsRestGetGroupsRequest':
+            user = request['subjectLookups'][0]['subjectId'].split('-', 1)[1]
+            return 200, {'WsGetGroupsResults': {'results': [{'wsGroups': [
+                {'name': name} for name, members in sorted(self.members.items()) if user in members]}]}}
+        if request_type == 'WsRestGetSubjectsRequest':
+            return 200, {'WsGetSubjectsResults': {'wsSubjects': [
+                {'id': 'id-' + s['subjectIdentifier'], 'resultCode': 'SUCCESS', 'attributeValues': []}
+                for s in request['wsSubjectLookups']]}}
+        raise AssertionError(f'unexpected request {request_type}')
+
+
+@pytest.fixture
+def directory(grouper):
+    directory = Directory()
+    client, adapter = grouper(directory, membership_ttl=30)
+    return directory, client, adapter
+
+
+def test_lookups_are_cached(directory):
+    _, client, adapter = directory
+    assert client.get_group_id('g') == 'uuid-test:stem:g'
+    assert client.get_group_id('g') == 'uuid-test:stem:g'
+    assert len(adapter.requests) == 1
+
+
+def test_call_shapes_share_a_cache_entry(directory):
+    _, client, adapter = directory
+    client.get_group_members('g')
+    client.get_group_members(group_name='g')
+    client.get_users_by_username(['alice', 'bob'])
+    client.get_users_by_username(member_uids=('alice', 'bob'), batch_size=500)
+    assert len(adapter.requests) == 2
+
+
+def test_set_and_iterator_arguments(directory):
+    _, client, adapter = directory
+    assert sorted(client.get_users_by_username({'alice', 'bob'})) == ['id-alice', 'id-bob']
+    assert sorted(client.get_users_by_username(iter(['alice', 'bob']))) == ['id-alice', 'id-bob']
+    assert len(adapter.requests) == 2
+
+
+@pytest.mark.parametrize('read', [
+    lambda client: client.get_group_members('g'),
+    lambda client: client.get_group_members(group_name='g'),
+])
+def test_adding_members_invalidates_cached_members(directory, read):
+    _, client, adapter = directory
+    assert read(client).usernames == {'alice'}
+    client.add_members_to_group('g', ['bob'])
+    assert read(client).usernames == {'alice', 'bob'}
+    assert len(adapter.requests) == 3
+
+
+def test_membership_checks_are_not_cached(directory):
+    _, client, adapter = directory
+    assert not client.is_user_in_group(group_name='g', user_uid='bob')
+    client.add_members_to_group('g', ['bob'])
+    assert client.is_user_in_group(group_name='g', user_uid='bob')
+    assert len(adapter.requests) == 3
+
+
+def test_membership_checks_without_has_member_ignore_cached_members(directory):
+    directory, client, _ = directory
+    client.get_group_members('g')
+    # added by someone else, so the cached members are not invalidated
+    directory.members['test:stem:g'].add('carol')
+    assert client.is_user_in_group('g', 'carol', use_has_member=False)
+
+
+def test_invalidate_group_matches_keyword_calls(directory):
+    _, client, adapter = directory
+    client.group_exists(group_name='g')
+    client.invalidate_group('g')
+    client.group_exists(group_name='g')
+    assert len(adapter.requests) == 2
+
+
+def test_changing_a_result_does_not_change_the_cache(directory):
+    _, client, _ = directory
+    members = client.get_group_members('g')
+    members['id-mallory'] = 'mallory'
+    group = client.get_group('g')
+    group['groupResults'].clear()
+    assert client.get_group_members('g') == {'id-alice': 'alice'}
+    assert client.get_group_members('g').usernames == {'alice'}
+    assert client.get_group('g')['groupResults']
+
+
+def test_memberships_are_not_cached_by_default(grouper):
+    directory = Directory()
+    client, adapter = grouper(directory)
+    assert client.get_group_members('g').usernames == {'alice'}
+    directory.members['test:stem:g'].add('carol')
+    assert client.get_group_members('g').usernames == {'alice', 'carol'}
+    assert client.get_groups_for_member('id-alice')['results'][0]['wsGroups'] == [{'name': 'test:stem:g'}]
+    client.get_groups_for_member('id-alice')
+    client.get_group_id('g')
+    client.get_group_id('g')
+    assert len(adapter.requests) == 5
+
+
+def test_cache_ttl_zero_disables_the_cache(grouper):
+    client, adapter = grouper(Directory(), cache_ttl=0)
+    client.get_group_id('g')
+    client.get_group_id('g')
+    assert len(adapter.requests) == 2
+
+
+def test_clear_cache(directory):
+    _, client, adapter = directory
+    client.get_group_id('g')
+    client.clear_cache()
+    client.get_group_id('g')
+    assert len(adapter.requests) == 2
+
+
+class Outage:
+    """Answers as Directory does until failure is set, then fails every request with it."""
+
+    def __init__(self):
+        self.directory = Directory()
+        self.failure = None
+
+    def __call__(self, payload):
+        if isinstance(self.failure, Exception):
+            raise self.failure
+        if self.failure is not None:
+            return self.failure, {}
+        return self.directory(payload)
+
+
+@pytest.mark.parametrize('failure', [503, requests.exceptions.ConnectionError('connection refused'),
+                                     requests.exceptions.ReadTimeout('read timed out')])
+def test_fallback_returns_the_last_response_when_grouper_is_unavailable(grouper, failure):
+    outage = Outage()
+    client, adapter = grouper(outage, cache_ttl=0, cache_fallback=True)
+    group = client.get_group('g')
+    outage.failure = failure
+    assert client.get_group('g') == group
+    assert len(adapter.requests) > 1
+
+
+@pytest.mark.parametrize('status', [400, 404])
+def test_fallback_does_not_hide_client_errors(grouper, status):
+    outage = Outage()
+    client, _ = grouper(outage, cache_ttl=0, cache_fallback=True)
+    client.get_group('g')
+    outage.failure = status
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get_group('g')
+
+
+def test_without_fallback_errors_are_raised(grouper):
+    outage = Outage()
+    client, _ = grouper(outage, cache_ttl=0)
+    client.get_group('g')
+    outage.failure = 503
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get_group('g')
@@ -0,0 +1,35 @@
+import pytest
+from grouper_client import abstract_client
+
+
+def add_members(payload):
+    subjects = payload['WsRestAddMemberRequest']['subjectLookups']
+    return 200, {'WsAddMemberResults': {'results': [
+        {'wsSubject': {'identifierLookup': s['subjectIdentifier'], 'resultCode': 'SUCCESS'}} for s in subjects]}}
+
+
+@pytest.fixture
+def compress(monkeypatch):
+    monkeypatch.setattr(abstract_client, 'COMPRESS_REQUESTS', True)
+
+
+def test_large_bodies_are_compressed(grouper, compress):
+    client, adapter = grouper(add_members)
+    users = [f'user{i:04d}' for i in range(400)]
+    client.add_members_to_group('g', users)
+    assert adapter.encodings == ['gzip']
+    assert [s['subjectIdentifier'] for s in adapter.requests[0]['WsRestAddMemberRequest']['subjectLookups']] == users
+
+
+def test_small_bodies_are_not_compressed(grouper, compress):
+    client, adapter = grouper(add_members)
+    client.add_members_to_group('g', ['alice'])
+    assert adapter.encodings == [None]
+    assert adapter.requests[0]['WsRestAddMemberRequest']['subjectLookups'] == [{'subjectIdentifier': 'alice'}]
+
+
+def test_compression_can_be_disabled(grouper, monkeypatch):
+    monkeypatch.setattr(abstract_client, 'COMPRESS_REQUESTS', False)
+    client, adapter = grouper(add_members)
+    client.add_members_to_group('g', [f'user{i:04d}' for i in range(400)])
+    assert adapter.encodings == [None]
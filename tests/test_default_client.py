@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from grouper_client import grouper_client
+from grouper_client.grouper_client import GrouperClient, default_client
+
+
+@pytest.fixture
+def configured(key_path, monkeypatch):
+    """Configures default_client as the environment variables would, and discards the shared client after the test."""
+    created = []
+
+    def make_client():
+        created.append(GrouperClient('https://grouper.example.edu/grouper-ws/servicesRest/json/v2_4_000/',
+                                     'test-entity', key_path, 'test:stem', algorithm='ES256'))
+        return created[-1]
+
+    monkeypatch.setattr(grouper_client, 'GrouperClient', make_client)
+    grouper_client._default_client.cache_clear()
+    yield created
+    grouper_client._default_client.cache_clear()
+    for client in created:
+        client.close()
+
+
+def test_default_client_is_shared(configured):
+    client = default_client()
+    assert default_client() is client
+    assert client.stem == 'test:stem'
+    assert configured == [client]
+
+
+def test_default_client_is_created_once_across_threads(configured):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        clients = list(pool.map(lambda _: default_client(), range(16)))
+    assert len(configured) == 1
+    assert all(c is configured[0] for c in clients)
+
+
+def test_default_client_requires_configuration():
+    if grouper_client.GROUPER_API_URL is not None:
+        pytest.skip('GROUPER_API_URL is set')
+    grouper_client._default_client.cache_clear()
+    with pytest.raises(ValueError):
+        default_client()
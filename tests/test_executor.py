@@ -0,0 +1,22 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from grouper_client import abstract_client
+
+
+def test_concurrent_first_use_starts_one_pool(grouper, monkeypatch):
+    client, _ = grouper(lambda payload: (200, {}))
+    started = []
+
+    def slow_executor(**kwargs):
+        # widen the window between the check for a pool and starting one
+        time.sleep(0.05)
+        started.append(ThreadPoolExecutor(**kwargs))
+        return started[-1]
+
+    monkeypatch.setattr(abstract_client, 'ThreadPoolExecutor', slow_executor)
+    with ThreadPoolExecutor(max_workers=8) as callers:
+        executors = list(callers.map(lambda _: client._get_executor(), range(8)))
+    assert len(started) == 1
+    assert all(e is started[0] for e in executors)
+    client.close()
+    assert client._executor is None
@@ -0,0 +1,40 @@
+import pytest
+from grouper_client import abstract_client
+
+
+@pytest.fixture(params=['streamed', 'parsed'])
+def stream_mode(request, monkeypatch):
+    if request.param == 'parsed':
+        monkeypatch.setattr(abstract_client, 'ijson', None)
+    elif abstract_client.ijson is None:
+        pytest.skip('ijson is not installed')
+    return request.param
+
+
+def members_response(*subjects):
+    return 200, {'WsGetMembersResults': {'results': [
+        {'wsSubjects': [{'id': 'id-' + u, 'resultCode': 'SUCCESS', 'attributeValues': [f'User ({u})']}
+                        for u in subjects]} if subjects else {}]}}
+
+
+def test_get_group_members(grouper, stream_mode):
+    client, _ = grouper(lambda payload: members_response('alice', 'bob'))
+    members = client.get_group_members('g')
+    assert members == {'id-alice': 'alice', 'id-bob': 'bob'}
+    assert members.usernames == {'alice', 'bob'}
+
+
+def test_empty_group(grouper, stream_mode):
+    client, _ = grouper(lambda payload: members_response())
+    assert client.get_group_members('g') == {}
+
+
+def test_problem_response_raises(grouper, stream_mode):
+    problem = {'WsRestResultProblem': {'resultMetadata': {'success': 'F', 'resultCode': 'PROBLEM'}}}
+    client, adapter = grouper(lambda payload: (200, problem))
+    with pytest.raises(ValueError):
+        client.get_group_members('g')
+    # the error is not cached
+    with pytest.raises(ValueError):
+        client.get_group_members('g')
+    assert len(adapter.requests) == 2
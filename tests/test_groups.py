@@ -0,0 +1,72 @@
+import pytest
+
+
+class Stem:
+    """Answers find-groups requests for a stem holding count groups, g0000, g0001, ..."""
+
+    def __init__(self, count):
+        self.names = [f'test:stem:g{i:04d}' for i in range(count)]
+
+    def __call__(self, payload):
+        query = payload['WsRestFindGroupsRequest']['wsQueryFilter']
+        assert query['queryFilterType'] == 'FIND_BY_STEM_NAME' and query['stemName'] == 'test:stem'
+        start = (query['pageNumber'] - 1) * query['pageSize']
+        return 200, {'WsFindGroupsResults': {'groupResults': [
+            {'name': name, 'extension': name.rsplit(':', 1)[1]}
+            for name in self.names[start:start + query['pageSize']]]}}
+
+
+def pages_requested(adapter):
+    return sorted(p['WsRestFindGroupsRequest']['wsQueryFilter']['pageNumber'] for p in adapter.requests)
+
+
+@pytest.mark.parametrize('count, pages', [(0, [1]), (25, [1, 2, 3]), (30, [1, 2, 3, 4, 5]), (9, [1])])
+def test_get_all_groups(grouper, count, pages):
+    stem = Stem(count)
+    client, adapter = grouper(stem)
+    groups = client.get_all_groups(page_size=10, concurrency=2)
+    assert groups == [name.rsplit(':', 1)[1] for name in stem.names]
+    # pages are requested concurrency at a time until one comes back short
+    assert pages_requested(adapter) == pages
+
+
+def test_get_all_groups_details(grouper):
+    client, _ = grouper(Stem(3))
+    assert [g['name'] for g in client.get_all_groups(details=True, page_size=2)] == [
+        'test:stem:g0000', 'test:stem:g0001', 'test:stem:g0002']
+
+
+@pytest.mark.parametrize('count, pages', [(0, [1]), (25, [1, 2, 3]), (20, [1, 2, 3])])
+def test_iter_groups(grouper, count, pages):
+    stem = Stem(count)
+    client, adapter = grouper(stem)
+    assert list(client.iter_groups(page_size=10)) == [name.rsplit(':', 1)[1] for name in stem.names]
+    assert pages_requested(adapter) == pages
+
+
+def test_iter_groups_requests_one_page_ahead(grouper):
+    client, adapter = grouper(Stem(50))
+    groups = client.iter_groups(details=True, page_size=10)
+    names = [next(groups)['name'] for _ in range(11)]
+    assert names[10] == 'test:stem:g0010'
+    # the third page may already have been requested while the second is consumed, but no further
+    assert pages_requested(adapter) in ([1, 2], [1, 2, 3])
+    groups.close()
+
+
+def find_by_lookups(payload):
+    lookups = payload['WsRestFindGroupsRequest']['wsGroupLookups']
+    # Grouper leaves groups that do not exist out of the results
+    return 200, {'WsFindGroupsResults': {'groupResults': [
+        {'name': lookup['groupName'], 'uuid': 'uuid-' + lookup['groupName']}
+        for lookup in lookups if 'missing' not in lookup['groupName']]}}
+
+
+def test_get_groups_bulk(grouper):
+    client, adapter = grouper(find_by_lookups)
+    names = [f'g{i}' for i in range(5)] + ['missing']
+    groups = client.get_groups_bulk(names, batch_size=2)
+    assert list(groups) == names
+    assert groups['g3'] == {'name': 'test:stem:g3', 'uuid': 'uuid-test:stem:g3'}
+    assert groups['missing'] is None
+    assert sorted(len(p['WsRestFindGroupsRequest']['wsGroupLookups']) for p in adapter.requests) == [2, 2, 2]
@@ -0,0 +1,123 @@
+import gzip
+import json
+import pytest
+from grouper_client import abstract_client
+from grouper_client.grouper_client import GrouperClient
+
+# the HTTP/2 backend needs the optional http2 extra
+httpx = pytest.importorskip('httpx')
+
+
+class FakeGrouperTransport:
+    """
+    Answers the requests of the HTTP/2 backend in place of a Grouper server, as FakeGrouper
+    does for the requests backend. Responses go through the retries of _RetryTransport.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.authorizations = []
+
+    def __call__(self, request):
+        body = request.read()
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        payload = json.loads(body)
+        self.requests.append(payload)
+        self.authorizations.append(request.headers.get('Authorization'))
+        status, document = self.handler(payload)
+        return httpx.Response(status, json=document, request=request)
+
+
+@pytest.fixture
+def http2_grouper(key_path, monkeypatch):
+    """
+    Returns a function that builds a GrouperClient using the HTTP/2 backend, whose requests
+    are answered by a FakeGrouperTransport with the given handler. The client and the transport are returned.
+    """
+    clients = []
+
+    def make(handler, **kwargs):
+        fake = FakeGrouperTransport(handler)
+        monkeypatch.setattr(httpx.HTTPTransport, 'handle_request', lambda transport, request: fake(request))
+        client = GrouperClient('https://grouper.example.edu/grouper-ws/servicesRest/json/v2_4_000/',
+                               'test-entity', key_path, 'test:stem', http2=True, algorithm='ES256', **kwargs)
+        clients.append(client)
+        return client, fake
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(abstract_client.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def test_retry_after_is_capped(monkeypatch, sleeps):
+    responses = iter([httpx.Response(503, headers={'Retry-After': '3600'}), httpx.Response(200)])
+    monkeypatch.setattr(httpx.HTTPTransport, 'handle_request', lambda self, request: next(responses))
+    response = abstract_client._RetryTransport().handle_request(httpx.Request('POST', 'https://grouper.example.edu/'))
+    assert response.status_code == 200
+    assert sleeps == [abstract_client.RETRY_DELAY_MAX]
+
+
+def members_response(payload):
+    return 200, {'WsGetMembersResults': {'results': [{'wsSubjects': [
+        {'id': 'id-alice', 'resultCode': 'SUCCESS', 'attributeValues': ['Alice (alice)']}]}]}}
+
+
+def test_http2_backend(http2_grouper):
+    client, fake = http2_grouper(members_response)
+    assert isinstance(client._session, httpx.Client)
+    assert client.get_group_members('g') == {'id-alice': 'alice'}
+    assert fake.requests[0]['WsRestGetMembersRequest']['wsGroupLookups'] == [{'groupName': 'test:stem:g'}]
+    assert fake.authorizations == [f'Bearer {client.token}']
+
+
+def test_http2_backend_retries_gateway_errors(http2_grouper, sleeps):
+    statuses = iter([502, 503])
+    client, fake = http2_grouper(lambda payload: (next(statuses, 200), {'WsFindGroupsResults': {}}))
+    assert client.get_group('g') == {}
+    assert len(fake.requests) == 3
+    assert sleeps == [0.5, 1.0]
+
+
+def test_http2_backend_renews_the_token_after_a_401(http2_grouper):
+    statuses = iter([401])
+    client, fake = http2_grouper(lambda payload: (next(statuses, 200), {'WsFindGroupsResults': {}}))
+    assert client.get_group('g') == {}
+    assert len(fake.requests) == 2
+    assert fake.authorizations[0] != fake.authorizations[1]
+
+
+def test_http2_backend_raises_client_errors(http2_grouper):
+    client, _ = http2_grouper(lambda payload: (400, {}))
+    with pytest.raises(httpx.HTTPStatusError):
+        client.get_group('g')
+
+
+@pytest.mark.parametrize('failure, unavailable', [(503, True), (httpx.ConnectError('connection refused'), True),
+                                                  (httpx.ReadTimeout('read timed out'), True), (403, False)])
+def test_http2_backend_fallback(http2_grouper, sleeps, failure, unavailable):
+    failures = []
+
+    def handler(payload):
+        if failures:
+            if isinstance(failure, Exception):
+                raise failure
+            return failure, {}
+        return 200, {'WsFindGroupsResults': {'groupResults': [{'name': 'test:stem:g'}]}}
+
+    client, _ = http2_grouper(handler, cache_ttl=0, cache_fallback=True)
+    group = client.get_group('g')
+    failures.append(failure)
+    if unavailable:
+        assert client.get_group('g') == group
+    else:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.get_group('g')
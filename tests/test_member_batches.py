@@ -0,0 +1,35 @@
+import pytest
+import requests
+from grouper_client.grouper_client import MemberBatchError
+
+
+def add_members_handler(payload):
+    lookups = [s['subjectIdentifier'] for s in payload['WsRestAddMemberRequest']['subjectLookups']]
+    if 'bad' in lookups:
+        return 400, {'WsRestResultProblem': {}}
+    return 200, {'WsAddMemberResults': {'results': [
+        {'wsSubject': {'identifierLookup': m, 'resultCode': 'SUCCESS'}} for m in lookups]}}
+
+
+def test_add_members_merges_batches(grouper):
+    client, adapter = grouper(add_members_handler)
+    assert client.add_members_to_group('g', ['a', 'b', 'c'], batch_size=2) == {'a': True, 'b': True, 'c': True}
+    assert len(adapter.requests) == 2
+
+
+def test_failed_batch_keeps_applied_results(grouper):
+    client, adapter = grouper(add_members_handler)
+    with pytest.raises(MemberBatchError) as raised:
+        client.add_members_to_group('g', ['a', 'b', 'bad', 'c', 'd'], batch_size=2)
+    assert raised.value.results == {'a': True, 'b': True, 'd': True}
+    assert raised.value.failed == ['bad', 'c']
+    assert isinstance(raised.value.__cause__, requests.exceptions.HTTPError)
+    # failed batches are not sent again
+    assert len(adapter.requests) == 3
+
+
+def test_error_is_raised_as_is_when_nothing_was_applied(grouper):
+    client, adapter = grouper(add_members_handler)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.add_members_to_group('g', ['bad'])
+    assert len(adapter.requests) == 1
@@ -0,0 +1,96 @@
+import json
+import pytest
+from pydantic import ValidationError
+from grouper_client import grouper_client
+from grouper_client.models import (AddMembersRequest, BaseQueryFilter, FindGroupsRequest, GetGroupsForUserRequest,
+                                   GrouperRequest, GroupNameFilter, StemNameFilter, SubjectLookup, WsQueryFilter,
+                                   WsRestAddMemberRequest, WsRestFindGroupsRequest)
+
+
+ADD_MEMBERS = {'WsRestAddMemberRequest': {
+    'wsGroupLookup': {'groupName': 'test:stem:g'},
+    'subjectLookups': [{'subjectIdentifier': 'alice'}],
+    'replaceAllExisting': 'F'}}
+
+
+def body(request):
+    """Returns the request body as GrouperClient sends it when GROUPER_VALIDATE_PAYLOADS is set."""
+    return json.loads(request.model_dump_json(exclude_unset=True, exclude_none=True))
+
+
+def test_validated_payload(monkeypatch):
+    monkeypatch.setattr(grouper_client, 'GROUPER_VALIDATE_PAYLOADS', True)
+    payload = grouper_client._prepare_payload(AddMembersRequest, ADD_MEMBERS)
+    assert isinstance(payload, bytes)
+    assert json.loads(payload) == ADD_MEMBERS
+
+
+def test_inner_request_model_under_the_wrapper_key():
+    inner = WsRestAddMemberRequest(wsGroupLookup={'groupName': 'test:stem:g'},
+                                   subjectLookups=[SubjectLookup(subjectIdentifier='alice')],
+                                   replaceAllExisting=False)
+    assert body(AddMembersRequest(WsRestAddMemberRequest=inner)) == ADD_MEMBERS
+    assert AddMembersRequest.model_validate({'WsRestAddMemberRequest': inner}) == AddMembersRequest.model_validate(
+        ADD_MEMBERS)
+
+
+def test_unset_fields_of_an_inner_request_model_stay_unset():
+    inner = WsRestFindGroupsRequest(wsGroupLookups=[{'groupName': 'test:stem:g'}])
+    assert body(FindGroupsRequest(WsRestFindGroupsRequest=inner)) == {
+        'WsRestFindGroupsRequest': {'wsGroupLookups': [{'groupName': 'test:stem:g'}]}}
+
+
+def test_query_filter():
+    stem_filter = StemNameFilter(queryFilterType='FIND_BY_STEM_NAME', stemName='test:stem', ascending=True)
+    assert stem_filter.ascending == 'T'
+    request = FindGroupsRequest(wsQueryFilter=stem_filter)
+    assert body(request)['WsRestFindGroupsRequest']['wsQueryFilter'] == {
+        'queryFilterType': 'FIND_BY_STEM_NAME', 'stemName': 'test:stem', 'ascending': 'T'}
+    assert isinstance(FindGroupsRequest(wsQueryFilter={'queryFilterType': 'FIND_BY_GROUP_NAME_EXACT',
+                                                       'groupName': 'test:stem:g'}).wsQueryFilter, GroupNameFilter)
+    with pytest.raises(ValidationError):
+        FindGroupsRequest(wsQueryFilter={'queryFilterType': 'FIND_BY_GROUP_NAME_EXACT', 'stemName': 'test:stem'})
+
+
+def test_deprecated_ws_query_filter():
+    with pytest.deprecated_call():
+        ws_filter = WsQueryFilter(queryFilterType='FIND_BY_STEM_NAME', stemName='test:stem', ascending=True)
+    assert isinstance(ws_filter, WsQueryFilter)
+    assert isinstance(ws_filter, BaseQueryFilter)
+    with pytest.deprecated_call():
+        assert isinstance(WsQueryFilter.model_validate({'queryFilterType': 'FIND_BY_GROUP_NAME_EXACT',
+                                                         'groupName': 'test:stem:g'}), WsQueryFilter)
+    request = FindGroupsRequest(wsQueryFilter=ws_filter)
+    assert isinstance(request.wsQueryFilter, StemNameFilter)
+    assert body(request)['WsRestFindGroupsRequest']['wsQueryFilter'] == {
+        'queryFilterType': 'FIND_BY_STEM_NAME', 'stemName': 'test:stem', 'ascending': 'T'}
+    with pytest.raises(ValidationError), pytest.deprecated_call():
+        WsQueryFilter.model_validate({'queryFilterType': 'FIND_BY_GROUP_NAME_EXACT', 'stemName': 'test:stem'})
+
+
+def test_wrapper_keys():
+    assert AddMembersRequest.wrapper_key == 'WsRestAddMemberRequest'
+    assert FindGroupsRequest.wrapper_key == 'WsRestFindGroupsRequest'
+
+
+def test_subclasses_inherit_the_wrapper_key():
+    class PagedFindGroupsRequest(FindGroupsRequest):
+        pass
+
+    request = PagedFindGroupsRequest(wsGroupLookups=[{'groupName': 'test:stem:g'}])
+    assert PagedFindGroupsRequest.wrapper_key == 'WsRestFindGroupsRequest'
+    assert list(body(request)) == ['WsRestFindGroupsRequest']
+
+
+def test_lookups_omit_identifiers_that_were_not_given():
+    request = GetGroupsForUserRequest(subjectLookups=[SubjectLookup(subjectIdentifier='alice'), {'subjectId': '42'}],
+                                      subjectAttributeNames=[])
+    expected = [{'subjectIdentifier': 'alice'}, {'subjectId': '42'}]
+    assert list(request.model_dump(exclude_unset=True)['WsRestGetGroupsRequest']['subjectLookups']) == expected
+    assert json.loads(request.model_dump_json())['WsRestGetGroupsRequest']['subjectLookups'] == expected
+
+
+def test_request_model_without_an_inner_model():
+    with pytest.raises(TypeError, match='Bad must derive from an inner request model or set wrapper_key'):
+        class Bad(GrouperRequest):
+            pass
@@ -0,0 +1,60 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from grouper_client import grouper_client
+from grouper_client.grouper_client import GrouperClient, TOKEN_EXPIRY_SKEW, TOKEN_LIFETIME
+
+
+def claims(client):
+    return jwt.decode(client.token.split('_', 2)[2], options={'verify_signature': False})
+
+
+def test_tokens_renewed_within_a_second_differ(tmp_path):
+    path = tmp_path / 'grouper_rsa.pem'
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path.write_bytes(key.private_bytes(serialization.Encoding.PEM,
+                                       serialization.PrivateFormat.PKCS8,
+                                       serialization.NoEncryption()))
+    client = GrouperClient('https://grouper.example.edu/grouper-ws/servicesRest/json/v2_4_000/',
+                           'test-entity', str(path), 'test:stem', algorithm='RS256')
+    client.renew_token()
+    first = client.token
+    client.invalidate_token()
+    client.renew_token()
+    assert client.token != first
+    assert claims(client)['jti']
+    client.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces time.monotonic with a clock that only moves when now is changed."""
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(grouper_client.time, 'monotonic', lambda: Clock.now)
+    return Clock
+
+
+def test_token_is_reused_until_it_is_close_to_expiring(grouper, clock):
+    client, _ = grouper(lambda payload: (200, {}))
+    client.renew_token()
+    token = client.token
+    clock.now += TOKEN_LIFETIME - TOKEN_EXPIRY_SKEW - 1
+    client.renew_token()
+    assert client.token is token
+    clock.now += 1
+    client.renew_token()
+    assert client.token != token
+
+
+def test_requests_renew_a_stale_token(grouper, clock):
+    client, adapter = grouper(lambda payload: (200, {'WsFindGroupsResults': {'groupResults': []}}))
+    client.get_group('g')
+    token = client.token
+    client.get_group('h')
+    assert client.token is token
+    clock.now += TOKEN_LIFETIME - TOKEN_EXPIRY_SKEW
+    client.get_group('g2')
+    assert client.token != token
+    assert adapter.authorizations == [f'Bearer {token}', f'Bearer {token}', f'Bearer {client.token}']
@@ -0,0 +1,29 @@
+import pytest
+
+
+def subjects_by_id(payload):
+    lookups = payload['WsRestGetSubjectsRequest']['wsSubjectLookups']
+    return 200, {'WsGetSubjectsResults': {'wsSubjects': [
+        {'id': lookup['subjectId'], 'attributeValues': [f"User ({lookup['subjectId'].split('-', 1)[1]})"],
+         'resultCode': 'SUBJECT_NOT_FOUND' if lookup['subjectId'].startswith('missing') else 'SUCCESS'}
+        for lookup in lookups]}}
+
+
+def test_get_users_by_id_bulk(grouper):
+    client, adapter = grouper(subjects_by_id)
+    chunks = [['id-alice', 'id-bob', 'id-carol'], ['id-dave'], []]
+    assert client.get_users_by_id_bulk(chunks) == [['alice', 'bob', 'carol'], ['dave'], []]
+    assert sorted(len(p['WsRestGetSubjectsRequest']['wsSubjectLookups']) for p in adapter.requests) == [1, 3]
+
+
+def test_get_users_by_id_batches(grouper):
+    client, adapter = grouper(subjects_by_id)
+    ids = [f'id-user{i}' for i in range(5)]
+    assert client.get_users_by_id(ids, batch_size=2) == [f'user{i}' for i in range(5)]
+    assert sorted(len(p['WsRestGetSubjectsRequest']['wsSubjectLookups']) for p in adapter.requests) == [1, 2, 2]
+
+
+def test_get_users_by_id_bulk_missing_member(grouper):
+    client, _ = grouper(subjects_by_id)
+    with pytest.raises(ValueError):
+        client.get_users_by_id_bulk([['id-alice'], ['id-bob', 'missing-mallory']])